@@ -1,44 +1,86 @@
 # app.py
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import AsyncIterator
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Header, Query, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 
-from models import ResearchResponse, Paper, Summary
-from graph import build_workflow, ainvoke, astream_states
+from models import JobInfo, JobRequest, ResearchResponse, Paper, Summary
+from graph import RunConflict, accumulate, ainvoke, astream_events, check_run, get_workflow, warm_up
+from llm_router import aclose_llm_clients
+from utils import metrics
+from utils.arxiv_client import get_arxiv_service
+from utils.cache import get_result_cache
+from utils.jobs import DONE, Job, JobManager, QueueFull
 
 load_dotenv()
 
+# Build the workflow (and load embeddings) during startup instead of on the first request
+APP_WARMUP = os.getenv("APP_WARMUP", "0").lower() in ("1", "true", "yes")
+# Retry-After (seconds) sent with 429s when the job queue is full
+JOB_RETRY_AFTER = int(os.getenv("JOB_RETRY_AFTER", "5"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing heavy happens at import; the lifespan owns the workflow
+    app.state.workflow = None
+    app.state.jobs = _new_job_manager()
+    if APP_WARMUP:
+        app.state.workflow = await asyncio.to_thread(warm_up)
+    yield
+    await app.state.jobs.aclose()
+    app.state.workflow = None
+    # Drain pooled keep-alive connections on shutdown
+    await aclose_llm_clients()
+    await get_arxiv_service().aclose()
+
+
 app = FastAPI(
     title="PaperMind AI — Research Agent",
     version="1.0.0",
     description="Search → Summarize → Synthesize → Critique → Gaps (LangGraph + OpenRouter)",
+    lifespan=lifespan,
 )
 
-# Build workflow once at startup
-workflow = build_workflow()
 
-
-@app.get("/health")
-async def health():
-    return {"status": "ok"}
+async def _workflow():
+    # Built once, off the event loop, by the warm-up or the first request
+    workflow = getattr(app.state, "workflow", None)
+    if workflow is None:
+        workflow = app.state.workflow = await asyncio.to_thread(get_workflow)
+    return workflow
 
 
-@app.get(
-    "/research",
-    response_model=ResearchResponse,
-    summary="Run the full pipeline and return structured JSON",
-)
-async def research(q: str = Query(..., min_length=3, description="Research topic or question")):
+async def _check_run(q: str, run_id: str, resume: bool) -> None:
+    # A reused or mismatched run id is a 409; a resume the server can't do is a 400
     try:
-        final_state = await ainvoke(workflow, q)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        await check_run(await _workflow(), q, run_id, resume)
+    except RunConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _new_job_manager() -> JobManager:
+    return JobManager(_run_job, fold=accumulate, on_finish=_store_job)
 
+
+def _jobs() -> JobManager:
+    jobs = getattr(app.state, "jobs", None)
+    if jobs is None:
+        jobs = app.state.jobs = _new_job_manager()
+    return jobs
+
+
+def _response(q: str, final_state: Dict[str, Any], spans: Optional[List[Dict[str, Any]]] = None) -> ResearchResponse:
     # Coerce into typed response
     papers = [Paper(**p) for p in final_state.get("papers", [])]
     summaries = [Summary(**s) for s in final_state.get("summaries", [])]
@@ -49,34 +91,195 @@ async def research(q: str = Query(..., min_length=3, description="Research topic
         synthesis=final_state.get("synthesis") or "",
         critique=final_state.get("critique") or "",
         gaps=final_state.get("gaps") or "",
+        cache=final_state.get("cache"),
+        models=final_state.get("models") or {},
+        missing=final_state.get("missing") or {},
+        trace=spans,
+        run_id=final_state.get("run_id"),
     )
 
 
+def _sse(payload: Dict[str, Any], event_id: Optional[int] = None) -> bytes:
+    # For SSE, each event is `data: <json>\n\n`
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def _payload(event: Dict[str, Any]) -> Dict[str, Any]:
+    # Normalize to a lightweight structure to avoid huge payloads
+    if event["type"] == "token":
+        return {"token": event["text"], "node": event["node"], "seq": event["seq"]}
+    return {"delta": event["delta"], "node": event["node"], "seq": event["seq"]}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, summary="Prometheus metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get(
+    "/research",
+    response_model=ResearchResponse,
+    summary="Run the full pipeline and return structured JSON",
+)
+async def research(
+    q: str = Query(..., min_length=3, description="Research topic or question"),
+    semantic: Optional[bool] = Query(None, description="Serve near-duplicate queries from the cache"),
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0, description="Minimum cosine similarity for a semantic hit"),
+    deadline: Optional[float] = Query(
+        None, gt=0.0, le=600.0,
+        description="Time budget in seconds; stages that don't fit are shortened or skipped (see `missing`)",
+    ),
+    trace: bool = Query(False, description="Attach per-call timings (`trace`) to the response"),
+    run_id: Optional[str] = Query(None, max_length=128, description="Checkpoint the run under this id (default: generated)"),
+    resume: bool = Query(False, description="Continue run `run_id` from its last completed node"),
+):
+    spans = None
+    run_id = run_id or uuid.uuid4().hex
+    await _check_run(q, run_id, resume)
+    try:
+        with metrics.span("request", endpoint="/research"), metrics.collect_trace(trace) as spans:
+            final_state = await ainvoke(
+                await _workflow(), q, semantic=semantic, threshold=threshold, deadline=deadline,
+                run_id=run_id, resume=resume,
+            )
+    except RunConflict as e:
+        # Another request took the run id since the check
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        # The run keeps its checkpoints; retrying with resume=true skips the completed nodes
+        raise HTTPException(status_code=500, detail={"error": str(e), "run_id": run_id})
+    return _response(q, final_state, spans)
+
+
 @app.get(
     "/research/stream",
     summary="Stream partial results (NDJSON over text/event-stream)",
 )
-async def research_stream(q: str = Query(..., min_length=3)):
+async def research_stream(
+    q: str = Query(..., min_length=3),
+    semantic: Optional[bool] = Query(None, description="Serve near-duplicate queries from the cache"),
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0),
+    deadline: Optional[float] = Query(None, gt=0.0, le=600.0, description="Time budget in seconds"),
+    trace: bool = Query(False, description="Send per-call timings as a final {\"trace\": [...]} event"),
+    run_id: Optional[str] = Query(None, max_length=128, description="Checkpoint the run under this id (default: generated)"),
+    resume: bool = Query(False, description="Continue run `run_id` from its last completed node"),
+):
     """
     Streams state deltas as NDJSON (one JSON object per line) over SSE-compatible content-type.
-    Frontends can read line-by-line for live updates.
+    Frontends can read line-by-line for live updates. The pipeline runs once and
+    its result is cached; cache hits are replayed as a fast stream.
+
+    Events: {"delta": {node: update}, "node", "seq"} when a node completes, and
+    {"token": text, "node", "seq"} for LLM output from synthesize/critique/gaps.
+    Runs open with a "run" delta holding the `run_id` to resume them with.
     """
+    rid = run_id or uuid.uuid4().hex
+    await _check_run(q, rid, resume)
 
     async def gen() -> AsyncIterator[bytes]:
         try:
-            async for delta in astream_states(workflow, q):
-                # Normalize to a lightweight structure to avoid huge payloads
-                payload = {
-                    "delta": delta,
-                }
-                # For SSE, each event is `data: <json>\n\n`
-                line = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
-                yield line.encode("utf-8")
+            with metrics.span("request", endpoint="/research/stream"), metrics.collect_trace(trace) as spans:
+                async for event in astream_events(
+                    await _workflow(), q, semantic=semantic, threshold=threshold, deadline=deadline,
+                    run_id=rid, resume=resume,
+                ):
+                    yield _sse(_payload(event))
+            if spans is not None:
+                yield _sse({"trace": spans})
             # Signal end of stream
             yield b"data: [DONE]\n\n"
         except Exception as e:
             # Send error as an SSE event then finish
-            err = {"error": str(e)}
+            err = {"error": str(e), "run_id": rid}
             yield f"data: {json.dumps(err)}\n\n".encode("utf-8")
 
     return StreamingResponse(gen(), media_type="text/event-stream")
+
+
+# ----- Jobs: submit now, poll or subscribe for the result -----
+async def _run_job(job: Job) -> AsyncIterator[Dict[str, Any]]:
+    with metrics.span("request", endpoint="/research/jobs"):
+        async for event in astream_events(await _workflow(), job.query, **job.params):
+            yield event
+
+
+def _job_info(job: Job, position: Optional[int] = None) -> Dict[str, Any]:
+    info = job.to_dict(position)
+    if job.status == DONE:
+        info["result"] = _response(job.query, job.state).model_dump()
+        info["state"] = {}
+    return info
+
+
+async def _store_job(job: Job) -> None:
+    # Other worker processes answer polls for it from the shared result cache
+    await get_result_cache().aset(f"job:{job.id}", _job_info(job), ttl=_jobs().retention)
+
+
+@app.post(
+    "/research/jobs",
+    response_model=JobInfo,
+    status_code=202,
+    summary="Queue a research run and return its job id right away",
+)
+async def submit_job(req: JobRequest):
+    if req.run_id or req.resume:
+        await _check_run(req.q, req.run_id or uuid.uuid4().hex, req.resume)
+    try:
+        job = _jobs().submit(
+            req.q, semantic=req.semantic, threshold=req.threshold, deadline=req.deadline,
+            run_id=req.run_id, resume=req.resume,
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Job queue full: {e}", headers={"Retry-After": str(JOB_RETRY_AFTER)})
+    return _job_info(job, _jobs().position(job))
+
+
+@app.get("/research/jobs/{job_id}", response_model=JobInfo, summary="Job status and (partial) state")
+async def get_job(job_id: str):
+    job = _jobs().get(job_id)
+    if job is not None:
+        return _job_info(job, _jobs().position(job))
+    stored = await get_result_cache().aget(f"job:{job_id}")
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return stored
+
+
+@app.delete("/research/jobs/{job_id}", response_model=JobInfo, summary="Cancel a queued or running job")
+async def cancel_job(job_id: str):
+    job = await _jobs().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job on this worker")
+    return _job_info(job)
+
+
+@app.get("/research/jobs/{job_id}/events", summary="Stream a job's events (SSE)")
+async def job_events(
+    job_id: str,
+    after: int = Query(-1, description="Only events with a larger `seq` (resume point)"),
+    last_event_id: Optional[int] = Header(None),
+):
+    """
+    Same events as /research/stream, each with an SSE `id` (its `seq`), so
+    reconnecting clients resume via Last-Event-ID. Token events are only
+    available while the job runs. Ends with {"status", "error"} and [DONE].
+    """
+    job = _jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job on this worker")
+    start = last_event_id if last_event_id is not None else after
+
+    async def gen() -> AsyncIterator[bytes]:
+        async for event in job.follow(start):
+            yield _sse(_payload(event), event["seq"])
+        yield _sse({"status": job.status, "error": job.error})
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(gen(), media_type="text/event-stream")
@@ -0,0 +1,252 @@
+# benchmarks/fake_services.py
+"""
+Local stand-ins for OpenRouter (OpenAI-compatible chat + embeddings) and the
+arXiv Atom API, so benchmarks run with no network. Both add configurable
+latency with Gaussian jitter; chat completions can stream token by token.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+EMBED_DIM = 256
+
+_WORDS = (
+    "model data training method results benchmark attention graph retrieval transformer "
+    "robust evaluation dataset baseline scaling sparse learning objective inference latency"
+).split()
+
+
+@dataclass
+class Latency:
+    """
+    Per-request delay: `mean` seconds plus N(0, jitter), never below zero.
+    """
+
+    mean: float = 0.0
+    jitter: float = 0.0
+    seed: int = 0
+    _rng: random.Random = field(init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+
+    def sample(self) -> float:
+        if not self.jitter:
+            return max(0.0, self.mean)
+        with self._lock:
+            return max(0.0, self._rng.gauss(self.mean, self.jitter))
+
+
+def _embed(text: str) -> List[float]:
+    # Hashed bag of words: paraphrases sharing words land close together
+    vec = [0.0] * EMBED_DIM
+    for tok in re.findall(r"\w+", text.lower()):
+        h = int(hashlib.md5(tok.encode()).hexdigest(), 16)
+        vec[h % EMBED_DIM] += 1.0 if (h >> 64) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _completion_text(prompt: str, max_tokens: int) -> str:
+    n = max(1, min(max_tokens or 256, 200))
+    seed = int(hashlib.md5(prompt.encode()).hexdigest()[:8], 16)
+    return " ".join(_WORDS[(seed + i * 7) % len(_WORDS)] for i in range(n))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients dropping connections (cancelled calls, closed pools) are expected
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    server: "_Server"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self) -> Dict:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}")
+
+
+class FakeOpenAIHandler(_Handler):
+    def do_POST(self) -> None:
+        svc: FakeOpenAI = self.server.service  # type: ignore[attr-defined]
+        body = self._json()
+        path = urlparse(self.path).path
+        svc.count(path)
+        time.sleep(svc.latency.sample())
+        if path.endswith("/embeddings"):
+            inputs = body.get("input") or []
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            data = [{"object": "embedding", "index": i, "embedding": _embed(str(t))} for i, t in enumerate(inputs)]
+            out = {"object": "list", "data": data, "model": body.get("model"), "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+            self._send(200, json.dumps(out).encode(), "application/json")
+            return
+        if not path.endswith("/chat/completions"):
+            self._send(404, b"{}", "application/json")
+            return
+
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        text = _completion_text(prompt, body.get("max_tokens") or body.get("max_completion_tokens") or 256)
+        model = body.get("model", "fake")
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": model}
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(words := text.split(" ")), "total_tokens": 0}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if not body.get("stream"):
+            out = {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            self._send(200, json.dumps(out).encode(), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def emit(payload: str) -> None:
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for i, w in enumerate(words):
+            if svc.token_delay:
+                time.sleep(svc.token_delay)
+            delta = {"content": w if i == 0 else " " + w}
+            if i == 0:
+                delta["role"] = "assistant"
+            emit(json.dumps({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}))
+        emit(json.dumps({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            emit(json.dumps({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}))
+        emit("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeArxivHandler(_Handler):
+    def do_GET(self) -> None:
+        svc: FakeArxiv = self.server.service  # type: ignore[attr-defined]
+        qs = parse_qs(urlparse(self.path).query)
+        svc.count("query")
+        time.sleep(svc.latency.sample())
+        query = qs.get("search_query", [""])[0]
+        n = int(qs.get("max_results", ["5"])[0])
+        self._send(200, svc.feed(query, n), "application/atom+xml")
+
+
+class _Service:
+    handler: type = _Handler
+
+    def __init__(self, latency: Latency) -> None:
+        self.latency = latency
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[_Server] = None
+
+    def count(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def start(self, port: int = 0) -> "_Service":
+        self._server = _Server(("127.0.0.1", port), self.handler)
+        self._server.service = self  # type: ignore[attr-defined]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class FakeOpenAI(_Service):
+    """
+    /v1/chat/completions (plain and streamed) and /v1/embeddings.
+    `latency` applies once per request; `token_delay` between streamed tokens.
+    """
+
+    handler = FakeOpenAIHandler
+
+    def __init__(self, latency: Latency, token_delay: float = 0.0) -> None:
+        super().__init__(latency)
+        self.token_delay = token_delay
+
+    @property
+    def base_url(self) -> str:
+        return self.url + "/v1"
+
+
+class FakeArxiv(_Service):
+    """
+    arXiv export API stand-in; ids are stable per (query, rank), so repeated
+    queries return the same papers.
+    """
+
+    handler = FakeArxivHandler
+
+    @staticmethod
+    def paper_id(query: str, i: int) -> str:
+        h = int(hashlib.md5(f"{query}|{i}".encode()).hexdigest()[:8], 16)
+        return f"24{h % 12 + 1:02d}.{h % 100000:05d}"
+
+    def feed(self, query: str, n: int) -> bytes:
+        topic = re.sub(r"^all:", "", query).replace("+", " ")
+        entries = []
+        for i in range(n):
+            pid = self.paper_id(topic, i)
+            title = escape(f"{topic} study {i}")
+            abstract = escape(f"We study {topic}. " + _completion_text(f"{topic}{i}", 80))
+            entries.append(
+                f"<entry><id>http://arxiv.org/abs/{pid}v1</id><title>{title}</title>"
+                f"<summary>{abstract}</summary>"
+                f'<link title="pdf" href="http://arxiv.org/pdf/{pid}v1" rel="related" type="application/pdf"/>'
+                f"</entry>"
+            )
+        xml = '<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">' + "".join(entries) + "</feed>"
+        return xml.encode("utf-8")
+
+
+def full_text(topic: str, i: int, paragraphs: int = 12) -> str:
+    """
+    Deterministic stand-in for a paper's full text (for RETRIEVE_PDF_DIR).
+    """
+    return "\n\n".join(
+        f"Section {k}. {topic} " + _completion_text(f"{topic}|{i}|{k}", 120) for k in range(paragraphs)
+    )
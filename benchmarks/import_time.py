@@ -0,0 +1,79 @@
+# benchmarks/import_time.py
+"""
+Import-time budget check: imports each module in a fresh interpreter and
+fails (exit 1) when the best of --runs takes longer than --budget seconds
+or when it loads a module that should only load on first use.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget 1.0 --modules app graph
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET = float(os.getenv("IMPORT_BUDGET", "1.5"))
+MODULES = ["app", "graph", "utils.embeddings", "utils.cache"]
+# Loaded lazily (workflow build, first request, warm-up); importing any module above must not pull them in
+HEAVY = ["chromadb", "langgraph", "langchain_openai", "openai", "sentence_transformers", "torch", "pypdf"]
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int) -> Dict:
+    best: Optional[float] = None
+    heavy: List[str] = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            return {"module": module, "error": proc.stderr.strip().splitlines()[-1:]}
+        out = json.loads(proc.stdout.strip().splitlines()[-1])
+        best = out["seconds"] if best is None else min(best, out["seconds"])
+        heavy = out["heavy"]
+    return {"module": module, "seconds": round(best or 0.0, 4), "heavy": heavy}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--budget", type=float, default=IMPORT_BUDGET, help="seconds per module (IMPORT_BUDGET)")
+    ap.add_argument("--runs", type=int, default=3, help="fresh interpreters per module; the fastest counts")
+    ap.add_argument("--modules", nargs="+", default=MODULES)
+    args = ap.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        res = measure(module, max(1, args.runs))
+        if "error" in res:
+            print(f"FAIL {module}: import error {res['error']}")
+            failed = True
+            continue
+        problems = []
+        if res["seconds"] > args.budget:
+            problems.append(f"over budget ({args.budget:g}s)")
+        if res["heavy"]:
+            problems.append(f"loads {', '.join(res['heavy'])} eagerly")
+        failed = failed or bool(problems)
+        status = "FAIL" if problems else "ok"
+        print(f"{status:4} {module:20} {res['seconds']:.3f}s {'; '.join(problems)}".rstrip())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# benchmarks/react_memory.py
+"""
+Soak check for the ReAct agent's conversation memory: replays many chat
+sessions (search tool call, tool output, answer per turn) through a graph
+checkpointed by BoundedMemorySaver and fails (exit 1) when its size exceeds
+the cap or Python heap use keeps growing once the cap is reached.
+
+    python -m benchmarks.react_memory
+    python -m benchmarks.react_memory --sessions 5000 --turns 8 --max-mb 8 --spill /tmp/spill.sqlite3
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# Typical search_tool output: three titles with abstracts
+TOOL_OUTPUT = "\n\n".join(
+    f"Title: Paper {i}\nAbstract: {'lorem ipsum dolor sit amet ' * 40}\nURL: http://arxiv.org/abs/{i}" for i in range(3)
+)
+
+
+def build_agent(memory):
+    from langchain_core.messages import AIMessage, ToolMessage
+    from langgraph.graph import END, MessagesState, StateGraph
+
+    # Same message pattern as create_react_agent: a tool call, its output, then the answer
+    def agent(state):
+        last = state["messages"][-1]
+        if last.type == "tool":
+            return {"messages": [AIMessage(content="Answer based on the papers. " * 20)]}
+        call = {"name": "search_tool", "args": {"query": last.content}, "id": f"call_{random.getrandbits(32)}"}
+        return {"messages": [AIMessage(content="", tool_calls=[call])]}
+
+    def tools(state):
+        call = state["messages"][-1].tool_calls[0]
+        return {"messages": [ToolMessage(content=TOOL_OUTPUT, tool_call_id=call["id"], name=call["name"])]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("agent", agent)
+    graph.add_node("tools", tools)
+    graph.set_entry_point("agent")
+    graph.add_conditional_edges("agent", lambda s: "tools" if s["messages"][-1].tool_calls else END)
+    graph.add_edge("tools", "agent")
+    return graph.compile(checkpointer=memory)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=600)
+    ap.add_argument("--turns", type=int, default=5, help="questions per session")
+    ap.add_argument("--active", type=int, default=100, help="sessions taking turns at once")
+    ap.add_argument("--max-threads", type=int, default=150)
+    ap.add_argument("--max-mb", type=float, default=2.0)
+    ap.add_argument("--spill", default=None, help="spill file (default: a temporary one)")
+    ap.add_argument("--growth", type=float, default=0.15, help="allowed heap growth over the second half")
+    args = ap.parse_args(argv)
+
+    from langchain_core.messages import HumanMessage
+    from utils.checkpoints import BoundedMemorySaver
+
+    spill = args.spill or os.path.join(tempfile.mkdtemp(), "react_memory.sqlite3")
+    memory = BoundedMemorySaver(max_threads=args.max_threads, max_bytes=int(args.max_mb * 1024 * 1024), spill_path=spill)
+    agent = build_agent(memory)
+
+    # Sessions arrive in waves of `active`; each asks its questions interleaved with the others
+    total = args.sessions * args.turns
+    checkpoints = sorted({int(total * f) for f in (0.5, 0.75, 1.0)})
+    tracemalloc.start()
+    heap, done, t0 = {}, 0, time.perf_counter()
+    for wave in range(0, args.sessions, args.active):
+        ids = [f"session-{n}" for n in range(wave, min(wave + args.active, args.sessions))]
+        for turn in range(args.turns):
+            for thread_id in ids:
+                agent.invoke({"messages": [HumanMessage(content=f"question {turn} from {thread_id}")]},
+                             {"configurable": {"thread_id": thread_id}})
+                done += 1
+                if done in checkpoints:
+                    gc.collect()
+                    heap[done] = tracemalloc.get_traced_memory()[0]
+    elapsed = time.perf_counter() - t0
+
+    # An evicted session picks up where it left off
+    sample = agent.get_state({"configurable": {"thread_id": "session-0"}}).values.get("messages", [])
+    stats = memory.stats()
+    first, last = heap[checkpoints[0]], heap[checkpoints[-1]]
+    growth = (last - first) / first if first else 0.0
+    print(f"turns        {total} in {elapsed:.1f}s ({total / elapsed:.0f}/s)")
+    print(f"memory       {stats['threads']} threads, {stats['bytes'] / 1e6:.2f} MB (cap {args.max_mb:g} MB)")
+    print(f"spilled      {stats.get('spilled_threads', 0)} threads, {stats.get('spilled_bytes', 0) / 1e6:.2f} MB")
+    print(f"heap         {first / 1e6:.1f} MB at 50% -> {last / 1e6:.1f} MB at 100% ({growth:+.1%})")
+    print(f"session-0    {len(sample)} messages after reload")
+
+    problems = []
+    if stats["bytes"] > args.max_mb * 1024 * 1024:
+        problems.append("memory over cap")
+    if stats["threads"] > args.max_threads:
+        problems.append("too many threads")
+    if growth > args.growth:
+        problems.append("heap still growing")
+    if not sample:
+        problems.append("spilled session not restored")
+    for p in problems:
+        print(f"FAIL {p}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
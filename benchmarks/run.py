@@ -0,0 +1,348 @@
+# benchmarks/run.py
+"""
+Offline pipeline benchmark.
+
+Starts local fakes for OpenRouter and arXiv (see fake_services.py), points
+the app at them through its env vars, and measures:
+
+  - per-node latency and end-to-end p50/p95/p99 for cold runs
+  - throughput at increasing concurrency levels
+  - cache paths: exact hits, semantic hits, coalesced identical requests
+  - the same through the FastAPI app (/research and /research/stream, in-process ASGI)
+  - peak memory (max RSS, plus the tracemalloc peak with --tracemalloc)
+
+and exits 1 when an LLM node of a cold run (or a /research/stream
+response) streamed no token events.
+
+Results are written as JSON for comparing runs:
+
+    python -m benchmarks.run --concurrency 1,4,16 --requests 32 --out bench-results.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_services import FakeArxiv, FakeOpenAI, Latency, full_text  # noqa: E402
+
+# Predecessor of each node: its latency is the gap between the two node events
+_AFTER = {
+    "search": None,
+    "retrieve": "search",
+    "summarize": "retrieve",
+    "synthesize": "summarize",
+    "critique": "synthesize",
+    "gaps": "synthesize",
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"n": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    s = sorted(values)
+
+    def pick(p: float) -> float:
+        return s[min(len(s) - 1, max(0, int(round(p / 100 * len(s) + 0.5)) - 1))]  # nearest rank
+
+    return {
+        "n": len(s),
+        "mean": round(sum(s) / len(s), 4),
+        "p50": round(pick(50), 4),
+        "p95": round(pick(95), 4),
+        "p99": round(pick(99), 4),
+        "max": round(s[-1], 4),
+    }
+
+
+def _topics(n: int, prefix: str) -> List[str]:
+    return [f"{prefix} topic {i} neural retrieval" for i in range(n)]
+
+
+def _paraphrase(q: str) -> str:
+    words = q.split()
+    return " ".join(words[1:] + words[:1]).upper()
+
+
+def _configure_env(args: argparse.Namespace, llm: FakeOpenAI, arxiv: FakeArxiv, workdir: str) -> None:
+    os.environ.update(
+        {
+            "OPENROUTER_API_KEY": "bench",
+            "OPENROUTER_BASE_URL": llm.base_url,
+            "ARXIV_API_URL": arxiv.url + "/api/query",
+            "ARXIV_MIN_INTERVAL": str(args.arxiv_interval),
+            "SEARCH_MODE": "remote-only",
+            "SEARCH_MAX_RESULTS": str(args.papers),
+            "RETRIEVE_PDF_DIR": os.path.join(workdir, "papers"),
+            "RETRIEVE_OFFLINE": "1",
+            "OLLAMA_FALLBACK": "0",
+            "SEMANTIC_CACHE": "0",
+            "TOKENIZER": "estimate",  # tiktoken would try to download its encoding
+        }
+    )
+    # Every on-disk cache lives under ./.cache (and Chroma under ./.chroma)
+    os.chdir(workdir)
+
+
+def _write_papers(workdir: str, queries: List[str], n: int) -> None:
+    # Local full texts, so the retrieve node chunks and embeds without downloads
+    root = os.path.join(workdir, "papers")
+    os.makedirs(root, exist_ok=True)
+    for q in queries:
+        for i in range(n):
+            with open(os.path.join(root, FakeArxiv.paper_id(q, i) + "v1.txt"), "w", encoding="utf-8") as f:
+                f.write(full_text(q, i))
+
+
+async def _timed_run(graph: Any, workflow: Any, query: str, **kwargs) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    seen: Dict[str, float] = {}
+    first_token: Optional[float] = None
+    tokens: Dict[str, int] = {}
+    state: Dict[str, Any] = {}
+    async for ev in graph.astream_events(workflow, query, **kwargs):
+        now = time.perf_counter() - t0
+        if ev["type"] == "token":
+            first_token = now if first_token is None else first_token
+            tokens[ev["node"]] = tokens.get(ev["node"], 0) + 1
+            continue
+        seen.setdefault(ev["node"], now)
+        graph.accumulate(state, ev["delta"])
+    total = time.perf_counter() - t0
+
+    nodes: Dict[str, float] = {}
+    for node, t in seen.items():
+        if node not in _AFTER:
+            continue
+        prev = _AFTER[node]
+        if prev == "retrieve" and "retrieve" not in seen:
+            prev = "search"
+        nodes[node] = t - (seen.get(prev, 0.0) if prev else 0.0)
+    cache = (state.get("cache") or {}).get("hit", "miss")
+    return {
+        "total": total,
+        "first_token": first_token,
+        "nodes": nodes,
+        "cache": cache,
+        "missing": state.get("missing") or {},
+        # LLM nodes that ran but streamed no tokens (cache hits stream nothing by design)
+        "silent": sorted(n for n in graph.TOKEN_STREAM_NODES & set(seen) if not tokens.get(n))
+        if cache == "miss" else [],
+    }
+
+
+async def _run_level(fn, queries: List[str], concurrency: int) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(concurrency)
+    errors: List[str] = []
+
+    async def one(q: str):
+        async with sem:
+            try:
+                return await fn(q)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                return None
+
+    t0 = time.perf_counter()
+    results = [r for r in await asyncio.gather(*(one(q) for q in queries)) if r is not None]
+    wall = time.perf_counter() - t0
+    return {"results": results, "wall": wall, "errors": errors}
+
+
+def _summarize_level(level: Dict[str, Any], concurrency: int) -> Dict[str, Any]:
+    results = level["results"]
+    per_node: Dict[str, List[float]] = {}
+    paths: Dict[str, int] = {}
+    for r in results:
+        for node, t in r.get("nodes", {}).items():
+            per_node.setdefault(node, []).append(t)
+        paths[r.get("cache", "miss")] = paths.get(r.get("cache", "miss"), 0) + 1
+    out = {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(level["errors"]),
+        "wall_s": round(level["wall"], 4),
+        "throughput_rps": round(len(results) / level["wall"], 3) if level["wall"] else None,
+        "latency_s": percentiles([r["total"] for r in results]),
+        "cache_paths": paths,
+    }
+    silent = [n for r in results for n in r.get("silent", [])]
+    if silent:
+        out["silent_nodes"] = {n: silent.count(n) for n in sorted(set(silent))}
+    ttft = [r["first_token"] for r in results if r.get("first_token") is not None]
+    if ttft:
+        out["first_token_s"] = percentiles(ttft)
+    if per_node:
+        out["nodes_s"] = {n: percentiles(v) for n, v in per_node.items()}
+    if level["errors"]:
+        out["error_samples"] = level["errors"][:3]
+    return out
+
+
+async def bench_graph(args: argparse.Namespace, llm: FakeOpenAI, levels: List[int]) -> Dict[str, Any]:
+    import graph
+
+    t0 = time.perf_counter()
+    workflow = graph.build_workflow()
+    out: Dict[str, Any] = {"build_workflow_s": round(time.perf_counter() - t0, 4), "cold": []}
+
+    for c in levels:
+        queries = _topics(args.requests, f"graph c{c}")
+        out["cold"].append(_summarize_level(
+            await _run_level(lambda q: _timed_run(graph, workflow, q), queries, c), c))
+
+    # Exact hits: replay the last level's queries
+    out["exact_hit"] = _summarize_level(
+        await _run_level(lambda q: _timed_run(graph, workflow, q), queries, levels[-1]), levels[-1])
+
+    # Semantic hits: index fresh queries with semantic on, then ask paraphrases
+    sem_queries = _topics(min(args.requests, 8), "semantic")
+    await _run_level(lambda q: _timed_run(graph, workflow, q, semantic=True), sem_queries, levels[-1])
+    out["semantic_hit"] = _summarize_level(
+        await _run_level(
+            lambda q: _timed_run(graph, workflow, q, semantic=True, threshold=args.semantic_threshold),
+            [_paraphrase(q) for q in sem_queries],
+            levels[-1],
+        ),
+        levels[-1],
+    )
+
+    # Coalescing: many identical concurrent requests should cost one run
+    before = dict(llm.requests)
+    n = max(levels)
+    level = await _run_level(lambda q: _timed_run(graph, workflow, q), ["coalesced single query"] * n, n)
+    chat_calls = llm.requests.get("/v1/chat/completions", 0) - before.get("/v1/chat/completions", 0)
+    out["coalesced"] = {
+        **_summarize_level(level, n),
+        "llm_calls": chat_calls,
+        # one cold run makes a call per paper (summarize) plus synthesize, critique and gaps
+        "runs_executed": round(chat_calls / (args.papers + 3), 2),
+    }
+    return out
+
+
+async def bench_app(args: argparse.Namespace, levels: List[int]) -> Dict[str, Any]:
+    import httpx
+
+    t0 = time.perf_counter()
+    import app as app_module  # the workflow is built on the first request
+
+    out: Dict[str, Any] = {"import_s": round(time.perf_counter() - t0, 4), "research": [], "stream": []}
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def research(q: str) -> Dict[str, Any]:
+            t = time.perf_counter()
+            r = await client.get("/research", params={"q": q})
+            r.raise_for_status()
+            body = r.json()
+            return {"total": time.perf_counter() - t, "cache": (body.get("cache") or {}).get("hit", "miss")}
+
+        async def stream(q: str) -> Dict[str, Any]:
+            t = time.perf_counter()
+            first = None
+            async with client.stream("GET", "/research/stream", params={"q": q}) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if first is None and line.startswith("data:") and '"token"' in line:
+                        first = time.perf_counter() - t
+            # Fresh queries always run the LLM nodes, so a stream without tokens is a bug
+            return {"total": time.perf_counter() - t, "first_token": first, "silent": [] if first else ["stream"]}
+
+        for c in levels:
+            out["research"].append(_summarize_level(await _run_level(research, _topics(args.requests, f"app c{c}"), c), c))
+            out["stream"].append(_summarize_level(await _run_level(stream, _topics(args.requests, f"stream c{c}"), c), c))
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=["graph", "app", "both"], default="both")
+    ap.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    ap.add_argument("--requests", type=int, default=16, help="requests per concurrency level")
+    ap.add_argument("--papers", type=int, default=5, help="papers per query (SEARCH_MAX_RESULTS)")
+    ap.add_argument("--llm-latency", type=float, default=0.2, help="mean seconds per LLM / embedding request")
+    ap.add_argument("--llm-jitter", type=float, default=0.05)
+    ap.add_argument("--token-delay", type=float, default=0.002, help="seconds between streamed tokens")
+    ap.add_argument("--arxiv-latency", type=float, default=0.3)
+    ap.add_argument("--arxiv-jitter", type=float, default=0.1)
+    ap.add_argument("--arxiv-interval", type=float, default=0.0, help="ARXIV_MIN_INTERVAL rate limit")
+    ap.add_argument("--semantic-threshold", type=float, default=0.8)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--tracemalloc", action="store_true", help="also report the Python heap peak (slower)")
+    ap.add_argument("--out", default="bench-results.json")
+    args = ap.parse_args(argv)
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    out_path = os.path.abspath(args.out)
+
+    llm = FakeOpenAI(Latency(args.llm_latency, args.llm_jitter, args.seed), token_delay=args.token_delay).start()
+    arxiv = FakeArxiv(Latency(args.arxiv_latency, args.arxiv_jitter, args.seed + 1)).start()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    _configure_env(args, llm, arxiv, workdir)
+
+    queries = []
+    for c in levels:
+        queries += _topics(args.requests, f"graph c{c}")
+        queries += _topics(args.requests, f"app c{c}") + _topics(args.requests, f"stream c{c}")
+    _write_papers(workdir, queries + _topics(8, "semantic") + ["coalesced single query"], args.papers)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    results: Dict[str, Any] = {
+        "config": vars(args),
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workdir": workdir,
+        },
+    }
+    t0 = time.perf_counter()
+    try:
+        if args.mode in ("graph", "both"):
+            results["graph"] = asyncio.run(bench_graph(args, llm, levels))
+        if args.mode in ("app", "both"):
+            results["app"] = asyncio.run(bench_app(args, levels))
+    finally:
+        llm.stop()
+        arxiv.stop()
+
+    results["duration_s"] = round(time.perf_counter() - t0, 3)
+    results["fake_requests"] = {"llm": llm.requests, "arxiv": arxiv.requests}
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["memory"] = {"max_rss_mb": round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)}
+    if args.tracemalloc:
+        results["memory"]["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        tracemalloc.stop()
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {out_path}")
+    failed = False
+    for section in ("graph", "app"):
+        for key in ("cold", "research", "stream"):
+            for lvl in results.get(section, {}).get(key, []):
+                lat = lvl["latency_s"]
+                print(f"{section}/{key} c={lvl['concurrency']:>3}: p50={lat['p50']}s p95={lat['p95']}s "
+                      f"p99={lat['p99']}s {lvl['throughput_rps']} req/s errors={lvl['errors']}")
+                if lvl.get("silent_nodes"):
+                    print(f"FAIL {section}/{key} c={lvl['concurrency']}: no token events from {lvl['silent_nodes']}")
+                    failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,32 +1,157 @@
 # graph.py
 from __future__ import annotations
 
-from typing import AsyncIterator, Dict, Any
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Any, List, Optional, Tuple
 from functools import partial
-from langgraph.graph import StateGraph, END
 
-from utils.cache import cache_get, cache_add
+import httpx
 
+from utils.cache import cache_key, get_result_cache, semantic_add, semantic_lookup
+from utils import metrics
+from utils.deadline import StageBudget
+from utils.singleflight import SingleFlight
 
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+
+# Async node variants: graph.ainvoke / astream_states drive these directly on the
+# event loop, so slow OpenRouter/arXiv calls never block other requests.
 from nodes import (
-    search as search_node,
-    summarize as summarize_node,
-    synthesize as synthesize_node,
-    critique as critique_node,
-    gaps as gaps_node,
+    asearch as search_node,
+    asummarize as summarize_node,
+    asynthesize as synthesize_node,
+    acritique as critique_node,
+    agaps as gaps_node,
 )
 
 from llm_router import get_llm_for_task, get_embeddings
+from models import RState, merge_dicts
+
+
+# State key each stage needs from upstream; without it the stage is skipped
+_STAGE_INPUT = {
+    "retrieve": "papers",
+    "summarize": "papers",
+    "synthesize": "summaries",
+    "critique": "synthesis",
+    "gaps": "synthesis",
+}
+# Extra seconds a stage that handles its own timeout gets before it's cancelled
+SOFT_GRACE = 1.0
+
+# Transient failures (rate limits, 5xx, dropped connections) are retried with
+# exponential backoff before a stage is given up on
+NODE_RETRIES = int(os.getenv("NODE_RETRIES", "2"))
+NODE_RETRY_BACKOFF = float(os.getenv("NODE_RETRY_BACKOFF", "1.0"))
+NODE_RETRY_MAX_BACKOFF = 10.0
+
+
+def _transient(e: BaseException) -> bool:
+    status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409, 425, 429) or status >= 500
+    if isinstance(e, (ConnectionError, TimeoutError, httpx.TransportError)):
+        return True
+    # openai's connection errors don't share a base class with httpx's
+    return type(e).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _backoff(attempt: int) -> float:
+    delay = min(NODE_RETRY_MAX_BACKOFF, NODE_RETRY_BACKOFF * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _bounded(
+    stage: str,
+    fn: Callable,
+    budget: StageBudget,
+    required: bool = False,
+    soft: Optional[Callable[[float], Dict[str, Any]]] = None,
+) -> Callable:
+    """
+    Wrap an async node so it respects the run's deadline (the absolute
+    `deadline` in the run config, so a resumed run gets a fresh one): it gets
+    its StageBudget allowance, is skipped when that is too small or its input
+    is missing, and is cut off when it overruns. `soft` maps the allowance to
+    kwargs for nodes that shorten themselves (e.g. summarize drops papers)
+    rather than being cancelled.
+
+    Transient errors are retried NODE_RETRIES times with backoff, as long as
+    the deadline leaves room. Skips, timeouts and (unless `required`) errors
+    land in `missing` instead of failing the whole request; each run is
+    timed as a "node" span and degradations are counted by kind.
+    """
+
+    def degraded(sp: Any, kind: str, reason: str) -> Dict[str, Any]:
+        metrics.inc("node_degraded_total", node=stage, kind=kind)
+        sp.set(missing=reason)
+        return {"missing": {stage: reason}}
+
+    async def run(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        with metrics.span("node", node=stage) as sp:
+            need = _STAGE_INPUT.get(stage)
+            if need and not state.get(need) and state.get("missing"):
+                return degraded(sp, "skipped", f"skipped: no {need} (upstream stage missing)")
+
+            deadline = (config.get("configurable") or {}).get("deadline")
+            attempt = 0
+            while True:
+                timeout = None
+                if deadline is not None:
+                    timeout = budget.allowance(stage, deadline)
+                    if timeout < budget.min_seconds(stage) or timeout <= 0:
+                        left = max(0.0, deadline - time.time())
+                        return degraded(sp, "skipped", f"skipped: {left:.1f}s left before the deadline")
+
+                try:
+                    if timeout is None:
+                        return await fn(state)
+                    if soft is not None:
+                        return await asyncio.wait_for(fn(state, **soft(timeout)), timeout + SOFT_GRACE)
+                    return await asyncio.wait_for(fn(state), timeout)
+                except asyncio.TimeoutError as e:
+                    if timeout is None:
+                        err: Exception = e
+                    else:
+                        print(f"{stage}: timed out after {timeout:.1f}s")
+                        return degraded(sp, "timeout", f"timed out after {timeout:.1f}s")
+                except Exception as e:
+                    err = e
+
+                delay = _backoff(attempt)
+                if attempt < NODE_RETRIES and _transient(err) and (deadline is None or time.time() + delay < deadline):
+                    attempt += 1
+                    metrics.inc("node_retries_total", node=stage)
+                    print(f"{stage} failed ({type(err).__name__}: {err}); retry {attempt} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                if required:
+                    raise err
+                print(f"{stage} failed: {type(err).__name__}: {err}")
+                return degraded(sp, "error", f"failed: {type(err).__name__}: {err}")
+
+    return run
 
 
 def build_workflow():
+    # langgraph is imported here, not at module load, to keep `import graph` cheap
+    from langgraph.graph import StateGraph, END
+
     summarize_llm = get_llm_for_task("summarize")
     synthesize_llm = get_llm_for_task("synthesize")
     critique_llm = get_llm_for_task("critique")
     gaps_llm = get_llm_for_task("gaps")
 
     try:
-        from nodes import retrieve as retrieve_node
+        from nodes import aretrieve as retrieve_node
+        from nodes.retrieve import PAPER_TIMEOUT
         emb = get_embeddings()
         retrieve_fn = partial(retrieve_node, emb=emb)
         has_retrieve = True
@@ -39,16 +164,27 @@ def build_workflow():
     critique_fn = partial(critique_node, llm=critique_llm)
     gaps_fn = partial(gaps_node, llm=gaps_llm)
 
-    graph = StateGraph(dict)
+    stages = ["search"] + (["retrieve"] if has_retrieve else []) + ["summarize", "synthesize", ("critique", "gaps")]
+    budget = StageBudget(stages)
+
+    graph = StateGraph(RState)
     graph.set_entry_point("search")
 
-    graph.add_node("search", search_node)
+    # Without papers there is nothing to degrade to, so search errors still fail the request
+    graph.add_node("search", _bounded("search", search_node, budget, required=True))
     if has_retrieve:
-        graph.add_node("retrieve", retrieve_fn)
-    graph.add_node("summarize", summarize_fn)
-    graph.add_node("synthesize", synthesize_fn)
-    graph.add_node("critique", critique_fn)
-    graph.add_node("gaps", gaps_fn)
+        graph.add_node(
+            "retrieve",
+            _bounded(
+                "retrieve", retrieve_fn, budget,
+                # leave a slice of the allowance for embedding the passages
+                soft=lambda t: {"paper_timeout": min(PAPER_TIMEOUT, t * 0.7)},
+            ),
+        )
+    graph.add_node("summarize", _bounded("summarize", summarize_fn, budget, soft=lambda t: {"timeout": t}))
+    graph.add_node("synthesize", _bounded("synthesize", synthesize_fn, budget))
+    graph.add_node("critique", _bounded("critique", critique_fn, budget))
+    graph.add_node("gaps", _bounded("gaps", gaps_fn, budget))
 
     if has_retrieve:
         graph.add_edge("search", "retrieve")
@@ -57,49 +193,468 @@ def build_workflow():
         graph.add_edge("search", "summarize")
 
     graph.add_edge("summarize", "synthesize")
+    # critique and gaps only read the synthesis -> fan out, join before END
     graph.add_edge("synthesize", "critique")
-    graph.add_edge("critique", "gaps")
-    graph.add_edge("gaps", END)
+    graph.add_edge("synthesize", "gaps")
+    graph.add_edge(["critique", "gaps"], END)
 
-    return graph.compile()
+    from utils.checkpoints import get_checkpointer
 
+    # Checkpoints after every node make failed or partial runs resumable (see `ainvoke`)
+    return graph.compile(checkpointer=get_checkpointer())
 
 
-async def ainvoke(workflow, query: str) -> Dict[str, Any]:
-    MODEL_VERSION = "v1"
-    MODEL_NAME = "workflow"
+_workflow = None
+_workflow_lock = threading.Lock()
+
+
+def get_workflow():
+    """
+    The process-wide compiled workflow, built (LLM clients, embeddings) on
+    first use.
+    """
+    global _workflow
+    if _workflow is None:
+        with _workflow_lock:
+            if _workflow is None:
+                _workflow = build_workflow()
+    return _workflow
 
-    cached = cache_get(query, MODEL_NAME, MODEL_VERSION)
-    if cached:
-        print("Cache hit")
-        return cached
 
-    print("Running workflow")
-    initial_state = {
+def warm_up(embeddings: bool = True):
+    """
+    Pay first-request costs up front: build the workflow, open the result
+    cache and, with `embeddings`, load the embedding backend used by the
+    semantic cache. Returns the workflow.
+    """
+    workflow = get_workflow()
+    get_result_cache()
+    if embeddings:
+        try:
+            _get_embedder()
+        except Exception as e:
+            print(f"Warm-up: embeddings unavailable: {e}")
+    return workflow
+
+
+
+MODEL_VERSION = "v1"
+MODEL_NAME = "workflow"
+
+# Serve near-duplicate queries from the cache (opt-in; SEMANTIC_CACHE=1)
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "0").lower() in ("1", "true", "yes")
+
+# Also coalesce identical runs across uvicorn workers via a lease in the
+# shared SQLite result cache (in-process coalescing is always on)
+SINGLEFLIGHT_SHARED = os.getenv("SINGLEFLIGHT_SHARED", "0").lower() in ("1", "true", "yes")
+SINGLEFLIGHT_LOCK_TTL = float(os.getenv("SINGLEFLIGHT_LOCK_TTL", "300"))
+SINGLEFLIGHT_POLL = 0.25
+
+_flights = SingleFlight()
+
+# Nodes whose LLM output is streamed token by token from astream_events
+TOKEN_STREAM_NODES = {"synthesize", "critique", "gaps"}
+
+_embedder = None
+
+
+def _get_embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = get_embeddings()
+    return _embedder
+
+
+async def _embed_query(query: str) -> Optional[List[float]]:
+    try:
+        emb = await asyncio.to_thread(_get_embedder)
+        return await asyncio.to_thread(emb.embed_query, query)
+    except Exception as e:
+        print(f"Semantic cache disabled for this call: {e}")
+        return None
+
+
+def _initial_state(query: str) -> Dict[str, Any]:
+    return {
         "query": query,
         "papers": [],
         "summaries": [],
         "synthesis": None,
         "critique": None,
         "gaps": None,
+        "models": {},
+        "missing": {},
     }
 
-    final_state = await workflow.ainvoke(initial_state)
 
-    cache_add(query, MODEL_NAME, MODEL_VERSION, final_state)
+# Node -> state keys it produces, used to replay cached results as a stream
+_REPLAY_ORDER = [
+    ("search", ("papers",)),
+    ("summarize", ("summaries",)),
+    ("synthesize", ("synthesis",)),
+    ("critique", ("critique",)),
+    ("gaps", ("gaps",)),
+]
+
+
+_MERGED_KEYS = {"models", "missing"}
+
+
+def accumulate(state: Dict[str, Any], chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fold one `astream_states` delta ({node: update}) into `state`.
+    """
+    for update in chunk.values():
+        if isinstance(update, dict):
+            for k, v in update.items():
+                # merged across nodes, like their reducers in RState
+                state[k] = merge_dicts(state.get(k), v) if k in _MERGED_KEYS else v
+    return state
+
+
+def _replay(cached: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Anything no node "owns" (cache info, extra keys) goes in a leading "cache" delta
+    owned = {"query"}.union(*(keys for _, keys in _REPLAY_ORDER))
+    extra = {k: v for k, v in cached.items() if k not in owned}
+    chunks = [{"cache": extra}] if extra else []
+    for node, keys in _REPLAY_ORDER:
+        update = {k: cached[k] for k in keys if k in cached}
+        if update:
+            chunks.append({node: update})
+    return chunks
+
+
+async def _lookup(
+    query: str,
+    key: str,
+    semantic: Optional[bool],
+    threshold: Optional[float],
+) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+    """
+    Exact, then (optionally) semantic cache lookup -> (cached state, query vector).
+    The vector is returned so a fresh run can index its query afterwards.
+    """
+    cache = get_result_cache()
+    cached = await cache.aget(key)
+    if cached:
+        print("Cache hit")
+        metrics.inc("cache_requests_total", cache="result", result="exact")
+        return {**cached, "cache": {"hit": "exact", "matched_query": query, "similarity": 1.0}}, None
+
+    use_semantic = SEMANTIC_CACHE if semantic is None else semantic
+    vec = await _embed_query(query) if use_semantic else None
+    if vec is None:
+        metrics.inc("cache_requests_total", cache="result", result="miss")
+        return None, None
+
+    kwargs = {} if threshold is None else {"threshold": threshold}
+    try:
+        match = await asyncio.to_thread(semantic_lookup, vec, MODEL_NAME, MODEL_VERSION, **kwargs)
+    except Exception as e:
+        print(f"Semantic lookup failed: {e}")
+        match = None
+    if match:
+        matched_key, matched_query, similarity = match
+        cached = await cache.aget(matched_key)
+        if cached:
+            matched_query = cached.get("query") or matched_query
+            print(f"Semantic cache hit ({similarity:.3f}): {matched_query}")
+            metrics.inc("cache_requests_total", cache="result", result="semantic")
+            return {
+                **cached,
+                "cache": {"hit": "semantic", "matched_query": matched_query, "similarity": similarity},
+            }, vec
+    metrics.inc("cache_requests_total", cache="result", result="miss")
+    return None, vec
+
+
+class RunConflict(Exception):
+    """
+    The requested `run_id` names a run this request can't start or continue:
+    it already exists (and `resume` wasn't asked for) or was for another query.
+    """
+
+
+async def check_run(workflow, query: str, run_id: str, resume: bool) -> None:
+    """
+    Fail fast, before any work, on a run id the request can't use: RunConflict
+    as above, ValueError when resuming with checkpoints disabled.
+    """
+    if workflow.checkpointer is None:
+        if resume:
+            raise ValueError("Checkpoints are disabled (CHECKPOINTS=0); cannot resume")
+        return
+    values = (await workflow.aget_state({"configurable": {"thread_id": run_id}})).values
+    if values and not resume:
+        raise RunConflict(f"Run {run_id} already exists; pass resume=true to continue it, or a new run_id")
+    if values and values.get("query") != query:
+        raise RunConflict(f"Run {run_id} was for a different query")
+
+
+# Stages in run order; resuming a partial run restarts at the earliest missing one
+_STAGE_ORDER = ["search", "retrieve", "summarize", "synthesize", "critique", "gaps"]
+
 
+async def _resume_point(workflow, config: Dict[str, Any], query: str) -> Optional[Dict[str, Any]]:
+    """
+    Prepare the checkpointed run `config` points at to continue: returns the
+    state it already has (and moves `config` to the checkpoint to continue
+    from), or None when there is nothing to resume.
+
+    An interrupted or failed run continues with the node that didn't finish.
+    A run that finished with stages under `missing` is forked from the
+    checkpoint just before the earliest of them, so everything upstream is
+    reused and only the missing stages (and what depends on them) run again.
+    """
+    if workflow.checkpointer is None:
+        raise ValueError("Checkpoints are disabled (CHECKPOINTS=0); cannot resume")
+    snapshot = await workflow.aget_state(config)
+    if not snapshot.values:
+        return None
+    if snapshot.values.get("query") != query:
+        raise RunConflict(f"Run {config['configurable']['thread_id']} was for a different query")
+
+    if not snapshot.next:
+        missing = snapshot.values.get("missing") or {}
+        first = next((stage for stage in _STAGE_ORDER if stage in missing), None)
+        if first is None:
+            return None
+        async for snapshot in workflow.aget_state_history(config):
+            if first in snapshot.next:
+                break
+        else:
+            return None
+
+    config["configurable"]["checkpoint_id"] = snapshot.config["configurable"]["checkpoint_id"]
+    print(f"Resuming run {config['configurable']['thread_id']} at {', '.join(snapshot.next)}")
+    return dict(snapshot.values)
+
+
+def _token_text(msg: Any) -> str:
+    content = getattr(msg, "content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(c.get("text", "") for c in content if isinstance(c, dict))
+
+
+def _node_events(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    events: List[Dict[str, Any]] = []
+    for chunk in chunks:
+        for node, update in chunk.items():
+            events.append({"type": "node", "node": node, "seq": len(events), "delta": {node: update}})
+    return events
+
+
+async def _execute(
+    workflow,
+    key: str,
+    query: str,
+    vec: Optional[List[float]],
+    deadline: Optional[float] = None,
+    run_id: Optional[str] = None,
+    resume: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    One streamed run: forward node and token events, accumulate the final
+    state from the node deltas, cache it. Partial results (anything under
+    `missing`) are not cached.
+
+    The run is checkpointed under `run_id`, announced in a leading "run"
+    node event (which, when resuming, also carries the state restored from
+    the checkpoint). Complete runs drop their checkpoints; partial or failed
+    ones keep them so they can be resumed.
+    """
+    run_id = run_id or uuid.uuid4().hex
+    config: Dict[str, Any] = {"configurable": {"thread_id": run_id, "deadline": deadline}}
+    checkpointer = workflow.checkpointer
+
+    restored = None
+    if resume:
+        restored = await _resume_point(workflow, config, query)
+        if restored is None and checkpointer is not None:
+            # Nothing left to resume: run it again from scratch under the same id
+            await checkpointer.adelete_thread(run_id)
+    elif checkpointer is not None and (await workflow.aget_state(config)).values:
+        # It may still be running; never overwrite or merge into another run's checkpoints
+        raise RunConflict(f"Run {run_id} already exists; pass resume=true to continue it, or a new run_id")
+    if restored is None:
+        print("Running workflow")
+        final_state = _initial_state(query)
+        inputs: Optional[Dict[str, Any]] = _initial_state(query)
+        yield {"type": "node", "node": "run", "seq": 0, "delta": {"run": {"run_id": run_id}}}
+    else:
+        final_state = {**_initial_state(query), **restored}
+        inputs = None
+        prior = {k: v for k, v in restored.items() if k != "query"}
+        yield {"type": "node", "node": "run", "seq": 0, "delta": {"run": {"run_id": run_id, **prior}}}
+
+    seq = 1
+    async for mode, data in workflow.astream(inputs, config, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            msg, meta = data
+            node = meta.get("langgraph_node")
+            text = _token_text(msg)
+            if node in TOKEN_STREAM_NODES and text:
+                yield {"type": "token", "node": node, "seq": seq, "text": text}
+                seq += 1
+            continue
+
+        accumulate(final_state, data)
+        for node, update in data.items():
+            yield {"type": "node", "node": node, "seq": seq, "delta": {node: update}}
+            seq += 1
+
+    if final_state.get("missing"):
+        print(f"Partial result not cached (resume with run_id={run_id}): {final_state['missing']}")
+        return
+    if checkpointer is not None:
+        await checkpointer.adelete_thread(run_id)
+    await get_result_cache().aset(key, final_state)
+    if vec is not None:
+        try:
+            await asyncio.to_thread(semantic_add, query, key, vec, MODEL_NAME, MODEL_VERSION)
+        except Exception as e:
+            print(f"Semantic index update failed: {e}")
+
+
+async def _run_once(
+    workflow,
+    key: str,
+    query: str,
+    vec: Optional[List[float]],
+    deadline: Optional[float] = None,
+    run_id: Optional[str] = None,
+    resume: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream the run for `key`, or replay the result of the worker that already
+    holds the shared lease for it. Deadline-bound and resumed runs never wait
+    on another worker's lease.
+    """
+    if not SINGLEFLIGHT_SHARED or deadline is not None or resume:
+        async for event in _execute(workflow, key, query, vec, deadline, run_id, resume):
+            yield event
+        return
+
+    cache = get_result_cache()
+    owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+    while True:
+        if await asyncio.to_thread(cache.acquire_lock, key, owner, SINGLEFLIGHT_LOCK_TTL):
+            try:
+                # The previous holder may have just finished
+                cached = await cache.aget(key)
+                if not cached:
+                    async for event in _execute(workflow, key, query, vec, run_id=run_id):
+                        yield event
+                    return
+            finally:
+                await asyncio.to_thread(cache.release_lock, key, owner)
+        else:
+            cached = await cache.aget(key)
+        if cached:
+            for event in _node_events(_replay(cached)):
+                yield event
+            return
+        await asyncio.sleep(SINGLEFLIGHT_POLL)
+
+
+async def ainvoke(
+    workflow,
+    query: str,
+    semantic: Optional[bool] = None,
+    threshold: Optional[float] = None,
+    deadline: Optional[float] = None,
+    run_id: Optional[str] = None,
+    resume: bool = False,
+) -> Dict[str, Any]:
+    """
+    Run the workflow behind the result cache.
+
+    With `semantic` (default: SEMANTIC_CACHE env), a miss on the exact key
+    falls back to the nearest previously answered query; a match above
+    `threshold` is served from the cache and reported under the "cache" key.
+
+    `deadline` is a time budget in seconds: stages share it, late stages are
+    shortened or skipped, and whatever is absent is explained under "missing".
+
+    Runs are checkpointed after every node under `run_id` (generated when not
+    given, returned as "run_id"). With `resume`, a partial or failed run
+    continues from its last completed node instead of starting over; the
+    `deadline` then budgets only the remaining stages.
+    """
+    final_state = _initial_state(query)
+    async for chunk in astream_states(
+        workflow, query, semantic=semantic, threshold=threshold, deadline=deadline, run_id=run_id, resume=resume
+    ):
+        accumulate(final_state, chunk)
     return final_state
 
 
+async def astream_events(
+    workflow,
+    query: str,
+    semantic: Optional[bool] = None,
+    threshold: Optional[float] = None,
+    deadline: Optional[float] = None,
+    run_id: Optional[str] = None,
+    resume: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream the run as events, each tagged with `node` and a stream-wide `seq`:
+      - {"type": "token", "node", "seq", "text"}: LLM output deltas from
+        the nodes in TOKEN_STREAM_NODES, as they are generated
+      - {"type": "node", "node", "seq", "delta"}: a node finished; `delta`
+        is the same {node: update} chunk `astream_states` yields
 
-async def astream_states(workflow, query: str) -> AsyncIterator[Dict[str, Any]]:
-    initial_state = {
-        "query": query,
-        "papers": [],
-        "summaries": [],
-        "synthesis": None,
-        "critique": None,
-        "gaps": None,
-    }
-    async for chunk in workflow.astream(initial_state):
-        yield chunk
+    Cache hits are replayed as node events only (prefixed by a "cache" node
+    event describing the hit). Misses run the workflow once, cache the final
+    state, and share that single execution with any concurrent caller of the
+    same query, streaming or not. With a `deadline` (seconds), the run only
+    coalesces with callers that gave the same budget.
+
+    Runs start with a "run" node event carrying the `run_id` to resume them
+    with (see `ainvoke`); a resumed run only coalesces with resumes of the
+    same run.
+    """
+    started = time.time()
+    key = cache_key(query, MODEL_NAME, MODEL_VERSION)
+    with metrics.span("cache", cache="result"):
+        cached, vec = await _lookup(query, key, semantic, threshold)
+    if cached:
+        for event in _node_events(_replay(cached)):
+            yield event
+        return
+
+    flight = key
+    abs_deadline = None
+    if deadline is not None:
+        flight = f"{key}@{deadline:g}s"
+        abs_deadline = started + deadline
+    if resume:
+        flight = f"{flight}#{run_id}"
+    if _flights.in_flight(flight):
+        metrics.inc("singleflight_joins_total")
+    async for event in _flights.stream(
+        flight, lambda: _run_once(workflow, key, query, vec, abs_deadline, run_id, resume)
+    ):
+        yield event
+
+
+async def astream_states(
+    workflow,
+    query: str,
+    semantic: Optional[bool] = None,
+    threshold: Optional[float] = None,
+    deadline: Optional[float] = None,
+    run_id: Optional[str] = None,
+    resume: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream per-node state deltas ({node: update}); fold them with `accumulate`
+    to get the final state, so callers never need a second run.
+    """
+    async for event in astream_events(
+        workflow, query, semantic=semantic, threshold=threshold, deadline=deadline, run_id=run_id, resume=resume
+    ):
+        if event["type"] == "node":
+            yield event["delta"]
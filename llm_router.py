@@ -1,13 +1,29 @@
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import Literal, Dict
+import threading
+import weakref
+from typing import TYPE_CHECKING, Literal, Dict, List, Optional, Tuple
 
-from langchain_openai import ChatOpenAI
+import httpx
 from utils.embeddings import EmbeddingProvider
+from utils.routing import HedgedLLM
+
+if TYPE_CHECKING:
+    # imported on first use; langchain-openai/openai take most of a second to load
+    from langchain_openai import ChatOpenAI
 
 Task = Literal["search", "summarize", "synthesize", "critique", "gaps"]
 
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+# Connection pool shared by every LLM client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "16"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
 
 TOKEN_LIMITS: Dict[Task, int] = {
     "search": 128,
@@ -18,18 +34,160 @@ TOKEN_LIMITS: Dict[Task, int] = {
 }
 
 
+class _LoopLocalTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport keeping one connection pool per event loop: the shared
+    AsyncClient works under FastAPI's single loop and under Streamlit's
+    asyncio.run() per interaction alike.
+    """
+
+    def __init__(self, limits: httpx.Limits) -> None:
+        self._limits = limits
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            pool = httpx.AsyncHTTPTransport(limits=self._limits)
+            self._pools[loop] = pool
+        return pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        for pool in list(self._pools.values()):
+            try:
+                await pool.aclose()
+            except Exception:
+                pass  # bound to a loop that is already gone
+        self._pools.clear()
+
+
+class LLMClientPool:
+    """
+    Registry of shared ChatOpenAI instances keyed by
+    (base_url, model, temperature, max_tokens). All of them sit on one pooled
+    keep-alive sync client and one async client, so stage calls reuse warm
+    connections instead of paying a TLS handshake each time.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive: int = LLM_MAX_KEEPALIVE,
+        keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        timeout: float = LLM_TIMEOUT,
+    ) -> None:
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._llms: Dict[Tuple[str, str, float, int], ChatOpenAI] = {}
+
+    def _clients(self) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        # caller holds self._lock
+        if self._client is None:
+            self._client = httpx.Client(limits=self._limits, timeout=self._timeout)
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(transport=_LoopLocalTransport(self._limits), timeout=self._timeout)
+        return self._client, self._aclient
+
+    def get(
+        self,
+        model: str,
+        temperature: float = 0.2,
+        max_tokens: int = 256,
+        base_url: str = OPENROUTER_BASE_URL,
+    ) -> ChatOpenAI:
+        from langchain_openai import ChatOpenAI
+
+        key = (base_url, model, float(temperature), int(max_tokens))
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is None:
+                api_key = os.getenv("OPENROUTER_API_KEY")
+                if not api_key:
+                    raise RuntimeError("OPENROUTER_API_KEY not set. Put it in .env")
+                client, aclient = self._clients()
+                llm = ChatOpenAI(
+                    base_url=base_url,
+                    api_key=api_key,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=self._timeout,
+                    http_client=client,
+                    http_async_client=aclient,
+                    # token usage on streamed answers too (exported as metrics)
+                    stream_usage=True,
+                )
+                self._llms[key] = llm
+            return llm
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            self._llms.clear()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            aclient, self._aclient = self._aclient, None
+        self.close()
+        if aclient is not None:
+            await aclient.aclose()
+
+
+_pool: Optional[LLMClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMClientPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = LLMClientPool()
+    return _pool
+
+
+async def aclose_llm_clients() -> None:
+    """
+    Close the shared HTTP pools (FastAPI shutdown). Clients handed out
+    earlier must not be used afterwards; new ones get fresh pools.
+    """
+    if _pool is not None:
+        await _pool.aclose()
+
+
 def _make_openrouter_llm(model: str, temperature: float = 0.2, max_tokens: int = 256) -> ChatOpenAI:
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENROUTER_API_KEY not set. Put it in .env")
+    return get_llm_pool().get(model, temperature=temperature, max_tokens=max_tokens)
 
-    return ChatOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key,
-        model=model,
-        temperature=temperature,
-        max_tokens=max_tokens,   # ✅ MAIN CHANGE
-    )
+
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+# Fall back to a local Ollama model when every remote model fails
+OLLAMA_FALLBACK = os.getenv("OLLAMA_FALLBACK", "1").lower() in ("1", "true", "yes")
+ROUTER_HEDGE = os.getenv("ROUTER_HEDGE", "1").lower() in ("1", "true", "yes")
+
+# Preferred (cheapest adequate) model first, hedge / failover targets after it
+ROUTING: Dict[Task, List[str]] = {
+    "search": ["mistralai/mistral-7b-instruct", "meta-llama/llama-3.1-8b-instruct"],
+    "summarize": ["mistralai/mistral-7b-instruct", "meta-llama/llama-3.1-8b-instruct"],
+    "synthesize": ["anthropic/claude-3.5-haiku", "openai/gpt-4o-mini"],
+    "critique": ["anthropic/claude-3.5-haiku", "openai/gpt-4o-mini"],
+    "gaps": ["meta-llama/llama-3.1-8b-instruct", "mistralai/mistral-7b-instruct"],
+}
 
 
 def _maybe_make_ollama(model: str, temperature: float = 0.2):
@@ -40,29 +198,38 @@ def _maybe_make_ollama(model: str, temperature: float = 0.2):
         return None
 
 
-def get_llm_for_task(task: Task):
+def get_llm_for_task(task: Task, routed: bool = True):
     """
     Cost-aware routing:
       - summarize -> cheap (fast)
       - synthesize -> more capable
       - critique/gaps -> mid
+
+    With `routed` (default) the result is a HedgedLLM over the task's
+    candidates: latency-aware, hedged after the primary's p95, with a local
+    Ollama fallback. `routed=False` returns the plain primary ChatOpenAI
+    (e.g. for agents that need `bind_tools`).
     """
-    routing: Dict[Task, str] = {
-        "search": "mistralai/mistral-7b-instruct",
-        "summarize": "mistralai/mistral-7b-instruct",
-        "synthesize": "anthropic/claude-3.5-haiku",
-        "critique": "anthropic/claude-3.5-haiku",
-        "gaps": "meta-llama/llama-3.1-8b-instruct",
-    }
-
-    model = routing.get(task, "mistralai/mistral-7b-instruct")
+    models = ROUTING.get(task, ["mistralai/mistral-7b-instruct"])
     max_tok = TOKEN_LIMITS.get(task, 256)
 
-    return _make_openrouter_llm(
-        model=model,
-        temperature=0.2,
-        max_tokens=max_tok,
-    )
+    if not routed:
+        return _make_openrouter_llm(model=models[0], temperature=0.2, max_tokens=max_tok)
+
+    candidates = []
+    try:
+        candidates = [(m, _make_openrouter_llm(model=m, temperature=0.2, max_tokens=max_tok)) for m in models]
+    except RuntimeError:
+        if not OLLAMA_FALLBACK:
+            raise  # no API key and nothing local to fall back to
+    fallback = None
+    if OLLAMA_FALLBACK:
+        local = _maybe_make_ollama(OLLAMA_MODEL, temperature=0.2)
+        if local is not None:
+            fallback = (f"ollama:{OLLAMA_MODEL}", local)
+    if not candidates and fallback is None:
+        raise RuntimeError("OPENROUTER_API_KEY not set and no local Ollama model available")
+    return HedgedLLM(candidates, fallback=fallback, hedge=ROUTER_HEDGE, task=task)
 
 
 def get_embeddings():
@@ -70,6 +237,7 @@ def get_embeddings():
         return EmbeddingProvider(
             use_openrouter=True,
             model="text-embedding-3-small",
+            base_url=OPENROUTER_BASE_URL,
         )
     except RuntimeError:
         # No OPENROUTER_API_KEY → fall back to local ST
@@ -1,16 +1,28 @@
-from typing import TypedDict, List, Optional
+from typing import Annotated, Any, Dict, TypedDict, List, Optional
+
+
+def merge_dicts(left: Optional[Dict], right: Optional[Dict]) -> Dict:
+    return {**(left or {}), **(right or {})}
+
 
 class RState(TypedDict):
+    # One channel per key: parallel branches (critique / gaps) may write
+    # concurrently as long as each returns only the keys it owns.
     query: str
     papers: List[dict]
     summaries: List[dict]
     synthesis: Optional[str]
     critique: Optional[str]
+    gaps: Optional[str]
+    # node -> model that answered; every LLM node adds its own entry
+    models: Annotated[Dict[str, str], merge_dicts]
+    # stage -> why its output is missing or partial (skipped, timed out, failed)
+    missing: Annotated[Dict[str, str], merge_dicts]
 
 
 
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 
 
 class Paper(BaseModel):
@@ -25,6 +37,12 @@ class Summary(BaseModel):
     url: str
 
 
+class CacheInfo(BaseModel):
+    hit: str  # "exact" | "semantic"
+    matched_query: Optional[str] = None
+    similarity: Optional[float] = None
+
+
 class ResearchResponse(BaseModel):
     query: str
     papers: List[Paper]
@@ -32,3 +50,35 @@ class ResearchResponse(BaseModel):
     synthesis: Optional[str]
     critique: Optional[str]
     gaps: Optional[str]
+    cache: Optional[CacheInfo] = None
+    models: Dict[str, str] = {}
+    # stage -> reason, for stages skipped, cut short or failed (e.g. under a deadline)
+    missing: Dict[str, str] = {}
+    # timed spans (nodes, LLM/arXiv/embedding/PDF calls) when requested with trace=true
+    trace: Optional[List[Dict[str, Any]]] = None
+    # checkpointed run; pass it back with resume=true to finish a partial result
+    run_id: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    q: str = Field(..., min_length=3, description="Research topic or question")
+    semantic: Optional[bool] = None
+    threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
+    # counted from when a worker picks the job up, not from submission
+    deadline: Optional[float] = Field(None, gt=0.0, le=600.0)
+    run_id: Optional[str] = Field(None, max_length=128)
+    resume: bool = False
+
+
+class JobInfo(BaseModel):
+    id: str
+    status: str  # queued | running | done | failed | cancelled
+    query: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    position: Optional[int] = None  # place in the queue while queued
+    error: Optional[str] = None
+    # state folded from the node events so far, until `result` is set
+    state: Dict[str, Any] = {}
+    result: Optional[ResearchResponse] = None
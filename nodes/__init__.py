@@ -1,8 +1,9 @@
-from .search import node as search
-from .summarize import node as summarize
-from .synthesize import node as synthesize
-from .critique import node as critique
-from .gaps import node as gaps
+from .search import node as search, anode as asearch
+from .summarize import node as summarize, anode as asummarize
+from .synthesize import node as synthesize, anode as asynthesize
+from .critique import node as critique, anode as acritique
+from .gaps import node as gaps, anode as agaps
+from .retrieve import node as retrieve, anode as aretrieve
 
 __all__ = [
     "search",
@@ -10,5 +11,12 @@ __all__ = [
     "synthesize",
     "critique",
     "gaps",
+    "retrieve",
+    "asearch",
+    "asummarize",
+    "asynthesize",
+    "acritique",
+    "agaps",
+    "aretrieve",
 ]
 
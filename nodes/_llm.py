@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+from utils.routing import answered_by
+
+
+def _llm_args(llm: Any, max_tokens: Optional[int], quiet: bool) -> Dict:
+    # Only LangChain-style models take per-call options; plain wrappers get the prompt alone
+    if not hasattr(llm, "ainvoke"):
+        return {}
+    kwargs: Dict[str, Any] = {}
+    if max_tokens:
+        kwargs["max_tokens"] = max_tokens
+    if quiet:
+        # Intermediate outputs (e.g. batch overviews) shouldn't show up in the token stream
+        kwargs["config"] = {"callbacks": []}
+    return kwargs
+
+
+def call_llm(llm: Any, prompt: str, max_tokens: Optional[int] = None, quiet: bool = False) -> Tuple[str, Optional[str]]:
+    """
+    Works with:
+    - langchain_openai.ChatOpenAI (returns object with .content)
+    - custom wrappers returning plain str
+    Returns (text, model that answered or None).
+    """
+    res = llm.invoke(prompt, **_llm_args(llm, max_tokens, quiet))
+    return getattr(res, "content", res), answered_by(res)
+
+
+async def acall_llm(llm: Any, prompt: str, max_tokens: Optional[int] = None, quiet: bool = False) -> Tuple[str, Optional[str]]:
+    """
+    Async variant of `call_llm`; falls back to a worker thread for
+    wrappers that only implement `invoke`.
+    """
+    if hasattr(llm, "ainvoke"):
+        res = await llm.ainvoke(prompt, **_llm_args(llm, max_tokens, quiet))
+    else:
+        res = await asyncio.to_thread(llm.invoke, prompt)
+    return getattr(res, "content", res), answered_by(res)
@@ -1,23 +1,39 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+from typing import Dict, Optional
 from prompts import CRIT_PROMPT
+from nodes._llm import acall_llm, call_llm
 
 
-def _call_llm(llm: Any, prompt: str) -> str:
-    res = llm.invoke(prompt)
-    return getattr(res, "content", res)
+def _update(text: str, model: Optional[str]) -> Dict:
+    out: Dict = {"critique": text.strip()}
+    if model:
+        out["models"] = {"critique": model}
+    return out
 
 
 def node(state: Dict, llm) -> Dict:
     """
     Critique the synthesis for bias, gaps, and clarity.
+    Returns only the `critique` (and `models`) keys so it can run in parallel with `gaps`.
     """
     synthesis = (state.get("synthesis") or "").strip()
     if not synthesis:
-        state["critique"] = ""
-        return state
+        return {"critique": ""}
 
     prompt = CRIT_PROMPT.format(s=synthesis)
-    state["critique"] = _call_llm(llm, prompt).strip()
-    return state
+    text, model = call_llm(llm, prompt)
+    return _update(text, model)
+
+
+async def anode(state: Dict, llm) -> Dict:
+    """
+    Async variant of `node`.
+    """
+    synthesis = (state.get("synthesis") or "").strip()
+    if not synthesis:
+        return {"critique": ""}
+
+    prompt = CRIT_PROMPT.format(s=synthesis)
+    text, model = await acall_llm(llm, prompt)
+    return _update(text, model)
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+from typing import Dict, Optional
+
+from nodes._llm import acall_llm, call_llm
 
 GAP_PROMPT = """
 You are a senior research scientist. From the synthesis below, extract:
@@ -15,19 +17,31 @@ SYNTHESIS:
 """
 
 
-def _call_llm(llm: Any, prompt: str) -> str:
-    res = llm.invoke(prompt)
-    return getattr(res, "content", res)
+def _update(text: str, model: Optional[str]) -> Dict:
+    out: Dict = {"gaps": text.strip()}
+    if model:
+        out["models"] = {"gaps": model}
+    return out
 
 
 def node(state: Dict, llm) -> Dict:
     """
     Produces a concise, actionable research-gap section.
+    Returns only the `gaps` (and `models`) keys so it can run in parallel with `critique`.
+    """
+    synthesis = (state.get("synthesis") or "").strip()
+    if not synthesis:
+        return {"gaps": ""}
+
+    return _update(*call_llm(llm, GAP_PROMPT.format(summary=synthesis)))
+
+
+async def anode(state: Dict, llm) -> Dict:
+    """
+    Async variant of `node`.
     """
     synthesis = (state.get("synthesis") or "").strip()
     if not synthesis:
-        state["gaps"] = ""
-        return state
+        return {"gaps": ""}
 
-    state["gaps"] = _call_llm(llm, GAP_PROMPT.format(summary=synthesis)).strip()
-    return state
+    return _update(*(await acall_llm(llm, GAP_PROMPT.format(summary=synthesis))))
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.arxiv_client import base_id, parse_arxiv_id
+from utils.embeddings import EmbeddingProvider
+from utils.pdf_store import get_pdf_store
+
+# Local PDFs/texts named <arxiv_id>.pdf / <arxiv_id>.txt are used before downloading
+PDF_DIR = os.getenv("RETRIEVE_PDF_DIR", "./papers")
+# Never download; only local files (and the abstracts) are used
+OFFLINE = os.getenv("RETRIEVE_OFFLINE", "0").lower() in ("1", "true", "yes")
+
+TOP_K = int(os.getenv("RETRIEVE_TOP_K", "4"))
+CONCURRENCY = int(os.getenv("RETRIEVE_CONCURRENCY", "4"))
+PAPER_TIMEOUT = float(os.getenv("RETRIEVE_PAPER_TIMEOUT", "15"))
+MAX_PDF_BYTES = int(os.getenv("RETRIEVE_MAX_PDF_BYTES", str(20 * 1024 * 1024)))
+MAX_PAGES = int(os.getenv("RETRIEVE_MAX_PAGES", "30"))
+MAX_CHUNKS = int(os.getenv("RETRIEVE_MAX_CHUNKS", "120"))
+
+CHUNK_CHARS = 1200
+CHUNK_OVERLAP = 200
+
+
+def _local_source(p: Dict) -> Optional[str]:
+    if p.get("pdf_path") and os.path.exists(p["pdf_path"]):
+        return p["pdf_path"]
+    arxiv_id = parse_arxiv_id(p.get("url", "")) or parse_arxiv_id(p.get("pdf_url") or "")
+    if not arxiv_id:
+        return None
+    for name in {arxiv_id, base_id(arxiv_id)}:
+        name = name.replace("/", "_")  # old-style ids: hep-th/9901001
+        for ext in (".txt", ".pdf"):
+            path = os.path.join(PDF_DIR, name + ext)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def _read_local_text(path: str) -> str:
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+def _check_size(path: str) -> None:
+    if os.path.getsize(path) > MAX_PDF_BYTES:
+        raise ValueError(f"{path} exceeds {MAX_PDF_BYTES} bytes")
+
+
+def _load_text(p: Dict, offline: bool = OFFLINE, deadline: Optional[float] = None) -> str:
+    """
+    Full text for one paper: local .txt/.pdf first, then (unless offline) the
+    PDF URL. PDFs go through the on-disk store, so each is fetched and parsed once.
+    """
+    path = _local_source(p)
+    if path and path.endswith(".txt"):
+        return _read_local_text(path)
+    if path:
+        _check_size(path)
+        return get_pdf_store().text_for_file(path, max_pages=MAX_PAGES, deadline=deadline)
+
+    url = p.get("pdf_url") or p.get("url")
+    if offline or not url:
+        return ""
+    return get_pdf_store().get_text(
+        url, max_pages=MAX_PAGES, timeout=PAPER_TIMEOUT, max_bytes=MAX_PDF_BYTES, deadline=deadline
+    )
+
+
+async def _aload_text(p: Dict, offline: bool = OFFLINE, deadline: Optional[float] = None) -> str:
+    path = _local_source(p)
+    if path and path.endswith(".txt"):
+        return await asyncio.to_thread(_read_local_text, path)
+    if path:
+        _check_size(path)
+        return await get_pdf_store().atext_for_file(path, max_pages=MAX_PAGES, deadline=deadline)
+
+    url = p.get("pdf_url") or p.get("url")
+    if offline or not url:
+        return ""
+    return await get_pdf_store().aget_text(
+        url, max_pages=MAX_PAGES, timeout=PAPER_TIMEOUT, max_bytes=MAX_PDF_BYTES, deadline=deadline
+    )
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Split on paragraph boundaries into ~`size`-char passages with `overlap`.
+    """
+    paras = [re.sub(r"\s+", " ", x).strip() for x in re.split(r"\n\s*\n", text)]
+    chunks: List[str] = []
+    buf = ""
+    for para in filter(None, paras):
+        while len(para) > size:
+            head, para = para[:size], para[size - overlap:]
+            if buf:
+                chunks.append(buf)
+                buf = ""
+            chunks.append(head)
+        if len(buf) + len(para) + 1 > size and buf:
+            chunks.append(buf)
+            buf = buf[-overlap:] + " " + para
+        else:
+            buf = f"{buf} {para}".strip()
+    if buf:
+        chunks.append(buf)
+    return chunks
+
+
+def _embed(emb: Any, texts: List[str]) -> np.ndarray:
+    # EmbeddingProvider batches, caches and can hand back a float32 array directly
+    if isinstance(emb, EmbeddingProvider):
+        return emb.embed_documents(texts, as_numpy=True)
+    return np.asarray(emb.embed_documents(texts), dtype=np.float32)
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.maximum(norms, 1e-12)
+
+
+def _select(
+    emb: Any,
+    query: str,
+    papers: List[Dict],
+    texts: List[str],
+    top_k: int,
+) -> List[Dict]:
+    """
+    Chunk every paper's text, embed all chunks together, and attach the
+    `top_k` passages most similar to the query to each paper.
+    """
+    owners: List[int] = []
+    chunks: List[str] = []
+    for i, text in enumerate(texts):
+        for c in chunk_text(text)[:MAX_CHUNKS]:
+            owners.append(i)
+            chunks.append(c)
+
+    out = [dict(p) for p in papers]
+    if not chunks:
+        return out
+
+    q = _normalize(np.asarray(emb.embed_query(query), dtype=np.float32))
+    scores = _normalize(_embed(emb, chunks)) @ q
+    owner_arr = np.asarray(owners)
+    for i, p in enumerate(out):
+        idx = np.flatnonzero(owner_arr == i)
+        if not len(idx):
+            continue
+        best = idx[np.argsort(-scores[idx])[:top_k]]
+        p["passages"] = [{"text": chunks[j], "score": float(scores[j])} for j in sorted(best)]
+    return out
+
+
+def _skipped(p: Dict, e: Exception) -> Tuple[str, bool]:
+    # "" (the abstract stands in) and whether the paper ran out of its time budget
+    print(f"retrieve: skipping full text for {p.get('url')}: {type(e).__name__} {e}")
+    return "", isinstance(e, (TimeoutError, asyncio.TimeoutError))
+
+
+def _fetch_all_sync(papers: List[Dict], timeout: float = PAPER_TIMEOUT) -> List[Tuple[str, bool]]:
+    results: List[Tuple[str, bool]] = []
+    for p in papers:
+        try:
+            results.append((_load_text(p, deadline=time.monotonic() + timeout), False))
+        except Exception as e:
+            results.append(_skipped(p, e))
+    return results
+
+
+async def _fetch_one(p: Dict, sem: asyncio.Semaphore, timeout: float) -> Tuple[str, bool]:
+    async with sem:
+        # The deadline bounds both the download and the text extraction
+        task = asyncio.ensure_future(_aload_text(p, deadline=time.monotonic() + timeout))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout), False
+        except Exception as e:
+            # A download thread can't be cancelled: keep the slot until it gives up at
+            # the deadline, so max_concurrency really bounds downloads in flight
+            await asyncio.gather(task, return_exceptions=True)
+            return _skipped(p, e)
+
+
+def _report_late(state: Dict, results: List[Tuple[str, bool]], timeout: float) -> None:
+    late = sum(1 for _, timed_out in results if timed_out)
+    if late:
+        state["missing"] = {
+            "retrieve": f"full text of {late} of {len(results)} papers not fetched within {timeout:g}s; abstracts used"
+        }
+
+
+def node(state: Dict, emb, top_k: int = TOP_K) -> Dict:
+    """
+    Attach query-relevant full-text passages (`paper["passages"]`) for summarize.
+    Papers whose PDF can't be had within budget keep just their abstract.
+    """
+    papers = state.get("papers", [])
+    if not papers:
+        return state
+    results = _fetch_all_sync(papers)
+    try:
+        state["papers"] = _select(emb, state["query"], papers, [t for t, _ in results], top_k)
+    except Exception as e:
+        print(f"retrieve: passage selection failed: {e}")
+    _report_late(state, results, PAPER_TIMEOUT)
+    return state
+
+
+async def anode(
+    state: Dict,
+    emb,
+    top_k: int = TOP_K,
+    max_concurrency: int = CONCURRENCY,
+    paper_timeout: float = PAPER_TIMEOUT,
+) -> Dict:
+    """
+    Async variant of `node`: PDFs are fetched and parsed concurrently, each
+    under its own time budget. Papers that ran out of it are counted under
+    `missing`.
+    """
+    papers = state.get("papers", [])
+    if not papers:
+        return state
+    sem = asyncio.Semaphore(max(1, max_concurrency))
+    results = list(await asyncio.gather(*(_fetch_one(p, sem, paper_timeout) for p in papers)))
+    try:
+        texts = [t for t, _ in results]
+        state["papers"] = await asyncio.to_thread(_select, emb, state["query"], papers, texts, top_k)
+    except Exception as e:
+        print(f"retrieve: passage selection failed: {e}")
+    _report_late(state, results, paper_timeout)
+    return state
@@ -1,36 +1,143 @@
 from __future__ import annotations
 
-import arxiv
-from typing import List, Dict
+import asyncio
+import os
+import threading
+from typing import List, Dict, Optional
+
+from utils.arxiv_client import get_arxiv_service
+from utils.catalog import PaperCatalog, get_catalog
+
+# "catalog-only" | "catalog-first" | "remote-only"
+SEARCH_MODE = os.getenv("SEARCH_MODE", "catalog-first")
+# A catalog hit counts when it matches at least this share of the query terms
+CATALOG_MIN_SCORE = float(os.getenv("CATALOG_MIN_SCORE", "0.75"))
+# Also keep a vector index in the catalog (uses llm_router.get_embeddings)
+CATALOG_VECTORS = os.getenv("CATALOG_VECTORS", "0").lower() in ("1", "true", "yes")
+# Papers per query; large sets are summarized concurrently and synthesized map-reduce
+MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "5"))
 
 
 def search_arxiv(query: str, max_results: int = 5) -> List[Dict]:
+    """
+    arXiv search through the shared, rate-limited client.
+    """
+    return get_arxiv_service().search(query, max_results=max_results)
+
+
+async def asearch_arxiv(query: str, max_results: int = 5) -> List[Dict]:
+    """
+    Async counterpart of `search_arxiv` (non-blocking HTTP via httpx).
+    """
+    return await get_arxiv_service().asearch(query, max_results=max_results)
+
+
+_shared_catalog: Optional[PaperCatalog] = None
+_catalog_init = threading.Lock()
+
+
+def _catalog() -> Optional[PaperCatalog]:
+    """
+    Shared catalog; None if it can't be opened (search then goes remote-only).
+    The embeddings provider is built once, with the catalog, not per search.
+    """
+    global _shared_catalog
+    if _shared_catalog is None:
+        with _catalog_init:
+            if _shared_catalog is None:
+                try:
+                    emb = None
+                    if CATALOG_VECTORS:
+                        from llm_router import get_embeddings
+                        emb = get_embeddings()
+                    _shared_catalog = get_catalog(emb=emb)
+                except Exception as e:
+                    print(f"Paper catalog unavailable: {e}")
+                    return None
+    return _shared_catalog
+
+
+def _from_catalog(catalog: Optional[PaperCatalog], query: str, max_results: int, min_score: float) -> List[Dict]:
+    if catalog is None:
+        return []
+    return [h for h in catalog.search(query, limit=max_results) if h["score"] >= min_score]
+
+
+def _remember(catalog: Optional[PaperCatalog], papers: List[Dict]) -> None:
+    if catalog is None:
+        return
+    try:
+        catalog.add_papers(papers)
+    except Exception as e:
+        print(f"Catalog update failed: {e}")
+
+
+def search(
+    query: str,
+    max_results: int = 5,
+    mode: Optional[str] = None,
+    min_score: float = CATALOG_MIN_SCORE,
+) -> List[Dict]:
+    """
+    Offline-first paper search: answer from the local catalog when it has
+    `max_results` strong hits, otherwise go to arXiv and catalog the results.
+    """
+    mode = mode or SEARCH_MODE
+    catalog = _catalog()
+
+    if mode != "remote-only":
+        hits = _from_catalog(catalog, query, max_results, min_score)
+        if mode == "catalog-only" or len(hits) >= max_results:
+            return hits
+    else:
+        hits = []
+
+    try:
+        papers = search_arxiv(query, max_results=max_results)
+    except Exception:
+        if hits:
+            return hits
+        raise
+    _remember(catalog, papers)
+    return papers
+
+
+async def asearch(
+    query: str,
+    max_results: int = 5,
+    mode: Optional[str] = None,
+    min_score: float = CATALOG_MIN_SCORE,
+) -> List[Dict]:
+    """
+    Async variant of `search`; catalog I/O runs in a worker thread.
+    """
+    mode = mode or SEARCH_MODE
+    catalog = await asyncio.to_thread(_catalog)
+
+    if mode != "remote-only":
+        hits = await asyncio.to_thread(_from_catalog, catalog, query, max_results, min_score)
+        if mode == "catalog-only" or len(hits) >= max_results:
+            return hits
+    else:
+        hits = []
+
+    try:
+        papers = await asearch_arxiv(query, max_results=max_results)
+    except Exception:
+        if hits:
+            return hits
+        raise
+    await asyncio.to_thread(_remember, catalog, papers)
+    return papers
+
+
+def node(state: dict, mode: Optional[str] = None, max_results: Optional[int] = None) -> dict:
+
+    state["papers"] = search(state["query"], max_results=max_results or MAX_RESULTS, mode=mode)
+    return state
+
+
+async def anode(state: dict, mode: Optional[str] = None, max_results: Optional[int] = None) -> dict:
 
-    client = arxiv.Client(
-        page_size=max_results,
-        delay_seconds=0.3,  # gentle rate-limiting
-        num_retries=2,
-    )
-    search = arxiv.Search(
-        query=query,
-        max_results=max_results,
-        sort_by=arxiv.SortCriterion.Relevance,
-    )
-
-    out: List[Dict] = []
-    for r in client.results(search):
-        out.append(
-            {
-                "title": r.title.strip(),
-                "abstract": (r.summary or "").strip(),
-                "url": r.entry_id,
-                "pdf_url": getattr(r, "pdf_url", None),
-            }
-        )
-    return out
-
-
-def node(state: dict) -> dict:
-
-    state["papers"] = search_arxiv(state["query"], max_results=5)
+    state["papers"] = await asearch(state["query"], max_results=max_results or MAX_RESULTS, mode=mode)
     return state
@@ -1,40 +1,129 @@
 from __future__ import annotations
 
-from typing import Dict, List, Any
-from prompts import SUMMARY_PROMPT
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from prompts import SUMMARY_PROMPT, SUMMARY_WITH_PASSAGES_PROMPT
+from nodes._llm import acall_llm, call_llm
+from utils.tokens import truncate_tokens
 
+# Upper bound on in-flight per-paper LLM calls (override with SUMMARIZE_CONCURRENCY)
+DEFAULT_CONCURRENCY = int(os.getenv("SUMMARIZE_CONCURRENCY", "5"))
+# Token cap on each of the abstract / passages sections of the prompt
+MAX_INPUT_TOKENS = int(os.getenv("SUMMARIZE_MAX_INPUT_TOKENS", "1250"))
 
-def _call_llm(llm: Any, prompt: str) -> str:
+
+def _safe_text(text: str, cap: int = MAX_INPUT_TOKENS) -> str:
+    return truncate_tokens(text, cap)
+
+
+def _prompt(p: Dict) -> str:
+    # Full-text passages attached by the retrieve node, when it ran
+    passages = [x.get("text", "") for x in p.get("passages") or []]
+    if passages:
+        return SUMMARY_WITH_PASSAGES_PROMPT.format(
+            title=p.get("title", ""),
+            abstract=_safe_text(p.get("abstract", "")),
+            passages=_safe_text("\n---\n".join(passages)),
+        )
+    return SUMMARY_PROMPT.format(
+        title=p.get("title", ""),
+        abstract=_safe_text(p.get("abstract", "")),
+    )
+
+
+def _empty_summary(p: Dict) -> Dict:
+    return {
+        "title": p.get("title", ""),
+        "summary": "",
+        "url": p.get("url", ""),
+        "pdf_url": p.get("pdf_url"),
+    }
+
+
+def _summarize_one(llm: Any, p: Dict) -> Dict:
     """
-    Works with:
-    - langchain_openai.ChatOpenAI (returns object with .content)
-    - custom wrappers returning plain str
+    Summarize a single paper. Failures degrade to an empty summary with
+    the error attached, so one bad paper never sinks the whole run.
     """
-    res = llm.invoke(prompt)
-    return getattr(res, "content", res)
+    out = _empty_summary(p)
+    prompt = _prompt(p)
+    try:
+        text, model = call_llm(llm, prompt)
+        out["summary"] = text.strip()
+        if model:
+            out["model"] = model
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"
+    return out
 
 
-def _safe_text(text: str, cap: int = 5000) -> str:
-    return text[:cap]
+async def _asummarize_one(llm: Any, p: Dict, sem: asyncio.Semaphore) -> Dict:
+    out = _empty_summary(p)
+    try:
+        async with sem:
+            text, model = await acall_llm(llm, _prompt(p))
+        out["summary"] = text.strip()
+        if model:
+            out["model"] = model
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"
+    return out
 
 
-def node(state: Dict, llm) -> Dict:
+def _record_models(state: Dict) -> None:
+    models = sorted({s["model"] for s in state["summaries"] if s.get("model")})
+    if models:
+        state["models"] = {"summarize": ", ".join(models)}
 
-    summaries: List[Dict] = []
-    for p in state.get("papers", []):
-        prompt = SUMMARY_PROMPT.format(
-            title=p.get("title", ""),
-            abstract=_safe_text(p.get("abstract", "")),
-        )
-        summary = _call_llm(llm, prompt).strip()
-        summaries.append(
-            {
-                "title": p.get("title", ""),
-                "summary": summary,
-                "url": p.get("url", ""),
-                "pdf_url": p.get("pdf_url"),
-            }
-        )
+
+def node(state: Dict, llm, max_concurrency: Optional[int] = None) -> Dict:
+
+    papers = state.get("papers", [])
+    workers = max(1, min(max_concurrency or DEFAULT_CONCURRENCY, len(papers) or 1))
+
+    # executor.map keeps the original paper order
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        summaries: List[Dict] = list(pool.map(lambda p: _summarize_one(llm, p), papers))
 
     state["summaries"] = summaries
+    _record_models(state)
+    return state
+
+
+async def anode(
+    state: Dict,
+    llm,
+    max_concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Dict:
+    """
+    With `timeout`, papers not summarized in time are cut (empty summary,
+    error "deadline") and the shortfall is reported under `missing`.
+    """
+    papers = state.get("papers", [])
+    sem = asyncio.Semaphore(max(1, max_concurrency or DEFAULT_CONCURRENCY))
+    tasks = [asyncio.ensure_future(_asummarize_one(llm, p, sem)) for p in papers]
+    pending = set()
+    try:
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+    finally:
+        # Cut papers, or all of them when the node itself is cancelled: stop their LLM calls
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # keep the input order
+    state["summaries"] = [
+        {**_empty_summary(p), "error": "deadline"} if t in pending else t.result()
+        for p, t in zip(papers, tasks)
+    ]
+    if pending:
+        state["missing"] = {
+            "summarize": f"{len(tasks) - len(pending)} of {len(tasks)} papers summarized before the deadline"
+        }
+    _record_models(state)
     return state
@@ -1,23 +1,129 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List
-from prompts import SYNTH_PROMPT
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from prompts import SYNTH_PROMPT, SYNTH_PARTIAL_PROMPT, SYNTH_REDUCE_PROMPT
+from nodes._llm import acall_llm, call_llm
+from utils.tokens import count_tokens, pack, scale_output, truncate_tokens
 
+# Summaries beyond this many tokens are synthesized map-reduce style:
+# token-bounded batches run concurrently, then their overviews are merged
+BATCH_TOKENS = int(os.getenv("SYNTH_BATCH_TOKENS", "3000"))
+CONCURRENCY = int(os.getenv("SYNTH_CONCURRENCY", "4"))
 
-def _call_llm(llm: Any, prompt: str) -> str:
-    res = llm.invoke(prompt)
-    return getattr(res, "content", res)
+# Output limits scale with the input size (ratio of input tokens, clamped)
+OUTPUT_RATIO = float(os.getenv("SYNTH_OUTPUT_RATIO", "0.25"))
+MIN_OUTPUT = int(os.getenv("SYNTH_MIN_OUTPUT", "512"))
+MAX_OUTPUT = int(os.getenv("SYNTH_MAX_OUTPUT", "1536"))
+PARTIAL_MIN_OUTPUT = 256
+PARTIAL_MAX_OUTPUT = 768
+# Reduce rounds before the remaining overviews are merged in one call regardless
+MAX_LEVELS = 3
+
+
+def _summaries(state: Dict) -> List[str]:
+    return [s["summary"].strip() for s in state.get("summaries", []) if (s.get("summary") or "").strip()]
+
+
+def _final_prompt(texts: List[str], level: int) -> Tuple[str, int]:
+    merged = "\n\n".join(texts)
+    tokens = count_tokens(merged)
+    template = SYNTH_PROMPT if level == 0 else SYNTH_REDUCE_PROMPT
+    return template.format(summaries=merged), scale_output(tokens, OUTPUT_RATIO, MIN_OUTPUT, MAX_OUTPUT)
+
+
+def _batches(texts: List[str]) -> Optional[List[List[str]]]:
+    """
+    Token-bounded batches for the map step, or None when one call fits.
+    """
+    if len(texts) <= 1 or count_tokens("\n\n".join(texts)) <= BATCH_TOKENS:
+        return None
+    batches = pack(texts, BATCH_TOKENS, overhead=2)
+    return batches if len(batches) > 1 else None
+
+
+def _partial_prompt(batch: List[str]) -> Tuple[str, int]:
+    merged = truncate_tokens("\n\n".join(batch), BATCH_TOKENS)
+    tokens = count_tokens(merged)
+    return (
+        SYNTH_PARTIAL_PROMPT.format(summaries=merged),
+        scale_output(tokens, OUTPUT_RATIO, PARTIAL_MIN_OUTPUT, PARTIAL_MAX_OUTPUT),
+    )
+
+
+def _keep(results: List) -> List[str]:
+    ok = [r[0].strip() for r in results if not isinstance(r, BaseException) and r[0].strip()]
+    if not ok:
+        # Every partial failed or came back empty
+        raise next(
+            (r for r in results if isinstance(r, BaseException)),
+            RuntimeError("all partial syntheses were empty"),
+        )
+    return ok
+
+
+def _synthesize(llm: Any, texts: List[str], level: int = 0) -> Tuple[str, Optional[str]]:
+    batches = _batches(texts) if level < MAX_LEVELS else None
+    if batches is None:
+        prompt, max_tokens = _final_prompt([truncate_tokens(t, BATCH_TOKENS) for t in texts], level)
+        return call_llm(llm, prompt, max_tokens)
+
+    def one(batch: List[str]):
+        try:
+            return call_llm(llm, *_partial_prompt(batch), quiet=True)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(CONCURRENCY, len(batches)))) as pool:
+        partials = _keep(list(pool.map(one, batches)))
+    return _synthesize(llm, partials, level + 1)
+
+
+async def _asynthesize(llm: Any, texts: List[str], sem: asyncio.Semaphore, level: int = 0) -> Tuple[str, Optional[str]]:
+    batches = _batches(texts) if level < MAX_LEVELS else None
+    if batches is None:
+        prompt, max_tokens = _final_prompt([truncate_tokens(t, BATCH_TOKENS) for t in texts], level)
+        return await acall_llm(llm, prompt, max_tokens)
+
+    async def one(batch: List[str]):
+        async with sem:
+            return await acall_llm(llm, *_partial_prompt(batch), quiet=True)
+
+    partials = _keep(list(await asyncio.gather(*(one(b) for b in batches), return_exceptions=True)))
+    return await _asynthesize(llm, partials, sem, level + 1)
 
 
 def node(state: Dict, llm) -> Dict:
+    """
+    One synthesis over all summaries; large sets go map-reduce (see BATCH_TOKENS).
+    """
+    parts = _summaries(state)
+    if not parts:
+        state["synthesis"] = ""
+        return state
+
+    text, model = _synthesize(llm, parts)
+    state["synthesis"] = text.strip()
+    if model:
+        state["models"] = {"synthesize": model}
+    return state
 
-    parts: List[str] = [s.get("summary", "") for s in state.get("summaries", []) if s.get("summary")]
-    merged = "\n\n".join(parts).strip()
 
-    if not merged:
+async def anode(state: Dict, llm, max_concurrency: Optional[int] = None) -> Dict:
+    """
+    Async variant of `node`; map batches run up to `max_concurrency` at once
+    and only the final reduce streams tokens.
+    """
+    parts = _summaries(state)
+    if not parts:
         state["synthesis"] = ""
         return state
 
-    prompt = SYNTH_PROMPT.format(summaries=merged)
-    state["synthesis"] = _call_llm(llm, prompt).strip()
+    sem = asyncio.Semaphore(max(1, max_concurrency or CONCURRENCY))
+    text, model = await _asynthesize(llm, parts, sem)
+    state["synthesis"] = text.strip()
+    if model:
+        state["models"] = {"synthesize": model}
     return state
@@ -10,6 +10,21 @@ ABSTRACT:
 {abstract}
 """
 
+SUMMARY_WITH_PASSAGES_PROMPT = """
+Summarize the following paper in ~150 words. Include:
+- Problem
+- Method
+- Findings
+- Limitations
+
+TITLE: {title}
+ABSTRACT:
+{abstract}
+
+RELEVANT EXCERPTS FROM THE FULL TEXT:
+{passages}
+"""
+
 SYNTH_PROMPT = """
 You are a research synthesis assistant.
 
@@ -25,6 +40,35 @@ SUMMARIES:
 {summaries}
 """
 
+# Map step of map-reduce synthesis: one batch of summaries
+SYNTH_PARTIAL_PROMPT = """
+You are a research synthesis assistant.
+
+Condense this batch of paper summaries into a compact overview that keeps
+every distinct method, finding, disagreement and open problem. Be terse;
+it will be merged with overviews of other batches.
+
+SUMMARIES:
+{summaries}
+"""
+
+# Reduce step: merge batch overviews into the final synthesis
+SYNTH_REDUCE_PROMPT = """
+You are a research synthesis assistant.
+
+Each overview below covers a different batch of papers on the same topic.
+Merge them into one cohesive field overview.
+Include:
+- Consensus
+- Conflicting ideas
+- Techniques used
+- Gaps / challenges
+- Future directions
+
+OVERVIEWS:
+{summaries}
+"""
+
 CRIT_PROMPT = """
 You are a critical research reviewer.
 
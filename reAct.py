@@ -1,23 +1,84 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
 from langchain.tools import tool
 from nodes.search import search_arxiv
 from llm_router import get_llm_for_task
 from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import MemorySaver
+from utils import metrics
+from utils.arxiv_client import merge_results
+from utils.cache import ResultCache
+from utils.checkpoints import get_react_memory
+
+# Papers per query, and queries per search_many_tool call
+SEARCH_TOOL_RESULTS = int(os.getenv("SEARCH_TOOL_RESULTS", "3"))
+SEARCH_TOOL_MAX_QUERIES = int(os.getenv("SEARCH_TOOL_MAX_QUERIES", "5"))
+# Tool output caps (characters), so one call can't flood the agent's context
+SEARCH_TOOL_MAX_CHARS = int(os.getenv("SEARCH_TOOL_MAX_CHARS", "4000"))
+SEARCH_TOOL_ABSTRACT_CHARS = int(os.getenv("SEARCH_TOOL_ABSTRACT_CHARS", "600"))
+# Repeated queries (within a conversation or across sessions) are answered from memory
+SEARCH_TOOL_CACHE_TTL = float(os.getenv("SEARCH_TOOL_CACHE_TTL", "3600"))
+SEARCH_TOOL_CACHE_ITEMS = int(os.getenv("SEARCH_TOOL_CACHE_ITEMS", "512"))
+
+_results = ResultCache(path=None, max_items=SEARCH_TOOL_CACHE_ITEMS, default_ttl=SEARCH_TOOL_CACHE_TTL)
+
+
+def _cached_search(query: str) -> List[Dict]:
+    key = f"{' '.join(query.lower().split())}:{SEARCH_TOOL_RESULTS}"
+    papers = _results.get(key)
+    metrics.inc("cache_requests_total", cache="search_tool", result="miss" if papers is None else "exact")
+    if papers is None:
+        papers = search_arxiv(query, max_results=SEARCH_TOOL_RESULTS)
+        _results.set(key, papers)
+    return papers
+
+
+def _format(papers: List[Dict]) -> str:
+    # Format for the LLM, stopping at SEARCH_TOOL_MAX_CHARS
+    formatted: List[str] = []
+    used = 0
+    for i, r in enumerate(papers):
+        abstract = r["abstract"]
+        if len(abstract) > SEARCH_TOOL_ABSTRACT_CHARS:
+            abstract = abstract[:SEARCH_TOOL_ABSTRACT_CHARS].rsplit(" ", 1)[0] + " ..."
+        entry = f"Title: {r['title']}\nAbstract: {abstract}\nURL: {r['url']}"
+        if formatted and used + len(entry) > SEARCH_TOOL_MAX_CHARS:
+            formatted.append(f"[{len(papers) - i} more results omitted]")
+            break
+        formatted.append(entry)
+        used += len(entry)
+    return "\n\n".join(formatted) or "No papers found."
+
 
 @tool
 def search_tool(query: str):
-    """Search for research papers on Arxiv. Returns titles and abstracts. 
+    """Search for research papers on Arxiv. Returns titles and abstracts.
     Use this to find relevant papers to answer the user's research question.
     """
-    results = search_arxiv(query, max_results=3)
-    # Format for the LLM
-    formatted = []
-    for r in results:
-        formatted.append(f"Title: {r['title']}\nAbstract: {r['abstract']}\nURL: {r['url']}")
-    return "\n\n".join(formatted)
+    return _format(_cached_search(query))
+
+
+@tool
+def search_many_tool(queries: List[str]):
+    """Search Arxiv for several queries at once (e.g. different angles of the
+    question) and return the papers found, without duplicates. Prefer this
+    over several search_tool calls.
+    """
+    queries = list(dict.fromkeys(q for q in queries if q.strip()))[:SEARCH_TOOL_MAX_QUERIES]
+    if not queries:
+        return "No queries given."
+    # Concurrent, still under the arXiv client's shared rate limit; a failing query is dropped
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        futures = [pool.submit(_cached_search, q) for q in queries]
+    results = [f.result() for f in futures if f.exception() is None]
+    if not results:
+        raise futures[0].exception()
+    return _format(merge_results(results))
+
 
 def build_react_agent():
 
-    llm = get_llm_for_task("synthesize") 
-    memory = MemorySaver()
-    return create_react_agent(llm, tools=[search_tool], checkpointer=memory)
+    llm = get_llm_for_task("synthesize", routed=False)  # agent needs bind_tools
+    # Shared, size-capped memory: conversations are compacted and evicted (see BoundedMemorySaver)
+    return create_react_agent(llm, tools=[search_tool, search_many_tool], checkpointer=get_react_memory())
@@ -1,9 +1,10 @@
 import streamlit as st
 import asyncio
+import uuid
 from dotenv import load_dotenv
 import json
 
-from graph import build_workflow, ainvoke, astream_states
+from graph import build_workflow, astream_events, accumulate
 from models import Paper, Summary
 from reAct import build_react_agent
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
@@ -29,6 +30,8 @@ if "workflow" not in st.session_state:
 if "react_agent" not in st.session_state:
     with st.spinner("Initializing ReAct Agent..."):
         st.session_state.react_agent = build_react_agent()
+    # The agent's memory is keyed by conversation; one per browser session
+    st.session_state.react_thread = uuid.uuid4().hex
 
 query = st.text_input("Research Topic", placeholder="Enter a research topic or question...")
 
@@ -41,12 +44,23 @@ if st.button("Start Research"):
             
             if workflow_type == "Standard Graph":
                 try:
-                    async for chunk in astream_states(st.session_state.workflow, query):
-                        for node_name, node_state in chunk.items():
-                            status_container.info(f"Processing: {node_name}...")
-                    
-                    status_container.info("Finalizing results...")
-                    final_state = await ainvoke(st.session_state.workflow, query)
+                    # Single run: the final state is folded from the streamed deltas,
+                    # while LLM tokens are rendered live as they arrive
+                    final_state = {"query": query}
+                    live_container = st.empty()
+                    live_text = {}
+                    async for event in astream_events(st.session_state.workflow, query):
+                        if event["type"] == "token":
+                            live_text[event["node"]] = live_text.get(event["node"], "") + event["text"]
+                            live_container.markdown(
+                                "\n\n".join(f"**{name}**\n\n{text}" for name, text in live_text.items())
+                            )
+                            continue
+                        status_container.info(f"Processing: {event['node']}...")
+                        accumulate(final_state, event["delta"])
+
+                    live_container.empty()
+
                     status_container.success("Research Complete!")
                     return final_state, "standard"
                     
@@ -63,7 +77,8 @@ if st.button("Start Research"):
                     final_response = ""
                     
 
-                    async for chunk in st.session_state.react_agent.astream({"messages": messages}):
+                    config = {"configurable": {"thread_id": st.session_state.react_thread}}
+                    async for chunk in st.session_state.react_agent.astream({"messages": messages}, config):
                         
                         if "agent" in chunk:
 
@@ -75,8 +90,8 @@ if st.button("Start Research"):
                                             st.write(f"Arguments: {tool_call['args']}")
                                 else:
                                     if msg.content:
-                                        # If it's the final chunk, it might be the answer
-                                        pass
+                                        # Last agent message without tool calls is the answer
+                                        final_response = msg.content
                         
                         if "tools" in chunk:
                             # Tool has responded
@@ -85,9 +100,6 @@ if st.button("Start Research"):
                                 with thinking_container.expander(f"Tool Output: {msg.name}", expanded=False):
                                     st.text(msg.content[:500] + "..." if len(msg.content) > 500 else msg.content)
 
-                    # Final answer
-                    result = await st.session_state.react_agent.ainvoke({"messages": messages})
-                    final_response = result["messages"][-1].content
                     status_container.success("Research Complete!")
                     return final_response, "react"
 
@@ -0,0 +1,256 @@
+# utils/arxiv_client.py
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import threading
+import time
+import weakref
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+from utils import metrics
+
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "https://export.arxiv.org/api/query")
+# Minimum spacing between requests, enforced process-wide
+ARXIV_MIN_INTERVAL = float(os.getenv("ARXIV_MIN_INTERVAL", "0.3"))
+ARXIV_MAX_CONNECTIONS = int(os.getenv("ARXIV_MAX_CONNECTIONS", "4"))
+ARXIV_TIMEOUT = float(os.getenv("ARXIV_TIMEOUT", "20"))
+
+_NS = {"atom": "http://www.w3.org/2005/Atom"}
+_ARXIV_ID = re.compile(r"arxiv\.org/(?:abs|pdf)/([^\s?#]+?)(v\d+)?(?:\.pdf)?$", re.IGNORECASE)
+
+
+def parse_arxiv_id(url: str) -> Optional[str]:
+    """
+    http://arxiv.org/abs/2401.01234v2 -> "2401.01234v2" (version kept when present).
+    """
+    m = _ARXIV_ID.search((url or "").strip())
+    if not m:
+        return None
+    return m.group(1) + (m.group(2) or "")
+
+
+def base_id(arxiv_id: str) -> str:
+    return re.sub(r"v\d+$", "", arxiv_id)
+
+
+def parse_feed(xml: bytes) -> List[Dict]:
+    """
+    arXiv Atom response -> [{title, abstract, url, pdf_url}].
+    """
+    out: List[Dict] = []
+    for entry in ET.fromstring(xml).iterfind("atom:entry", _NS):
+        entry_id = (entry.findtext("atom:id", "", _NS) or "").strip()
+        if not entry_id:
+            continue
+        pdf_url = None
+        for link in entry.iterfind("atom:link", _NS):
+            if link.get("title") == "pdf":
+                pdf_url = link.get("href")
+                break
+        out.append(
+            {
+                "title": (entry.findtext("atom:title", "", _NS) or "").strip(),
+                "abstract": (entry.findtext("atom:summary", "", _NS) or "").strip(),
+                "url": entry_id,
+                "pdf_url": pdf_url,
+            }
+        )
+    return out
+
+
+def merge_results(result_lists: Iterable[List[Dict]], limit: Optional[int] = None) -> List[Dict]:
+    """
+    Interleave ranked result lists (one per query variant) and drop duplicate
+    arXiv ids, keeping each paper at its best rank.
+    """
+    lists = [list(r) for r in result_lists]
+    seen = set()
+    out: List[Dict] = []
+    for rank in range(max((len(r) for r in lists), default=0)):
+        for results in lists:
+            if rank >= len(results):
+                continue
+            p = results[rank]
+            aid = parse_arxiv_id(p.get("url", ""))
+            key = base_id(aid) if aid else p.get("url") or p.get("title")
+            if key in seen:
+                continue
+            seen.add(key)
+            out.append(p)
+            if limit and len(out) >= limit:
+                return out
+    return out
+
+
+class ArxivService:
+    """
+    Process-wide arXiv search client.
+
+    - pooled keep-alive connections (one sync client, one async client per event loop)
+    - a single rate limiter shared by every thread and event loop in the process
+    - retries with backoff on transport errors, 429 and 5xx
+    - multi-query search that runs variants concurrently and dedupes by arXiv id
+    """
+
+    def __init__(
+        self,
+        api_url: str = ARXIV_API_URL,
+        min_interval: float = ARXIV_MIN_INTERVAL,
+        max_connections: int = ARXIV_MAX_CONNECTIONS,
+        timeout: float = ARXIV_TIMEOUT,
+        num_retries: int = 2,
+    ) -> None:
+        self.api_url = api_url
+        self.min_interval = min_interval
+        self.num_retries = num_retries
+        self._timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._client: Optional[httpx.Client] = None
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    # -- plumbing --
+    def _reserve(self) -> float:
+        """
+        Claim the next request slot; returns how long to wait before sending.
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+            return slot - now
+
+    def _sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(limits=self._limits, timeout=self._timeout)
+            return self._client
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._aclients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout)
+            self._aclients[loop] = client
+        return client
+
+    def _params(self, query: str, max_results: int) -> Dict[str, str]:
+        return {
+            "search_query": query,
+            "start": "0",
+            "max_results": str(max_results),
+            "sortBy": "relevance",
+            "sortOrder": "descending",
+        }
+
+    @staticmethod
+    def _retryable(e: Exception) -> bool:
+        if isinstance(e, httpx.HTTPStatusError):
+            return e.response.status_code == 429 or e.response.status_code >= 500
+        return isinstance(e, httpx.TransportError)
+
+    # -- single query --
+    @staticmethod
+    def _parse(r: httpx.Response, max_results: int, sp: Any) -> List[Dict]:
+        papers = parse_feed(r.content)[:max_results]
+        sp.set(bytes=len(r.content), items=len(papers))
+        return papers
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict]:
+        client = self._sync_client()
+        with metrics.span("arxiv", op="search") as sp:
+            for attempt in range(self.num_retries + 1):
+                time.sleep(self._reserve())
+                try:
+                    r = client.get(self.api_url, params=self._params(query, max_results))
+                    r.raise_for_status()
+                    return self._parse(r, max_results, sp)
+                except Exception as e:
+                    if attempt >= self.num_retries or not self._retryable(e):
+                        raise
+                    metrics.inc("arxiv_retries_total")
+                    time.sleep(self.min_interval * (2 ** attempt))
+        return []
+
+    async def asearch(self, query: str, max_results: int = 5) -> List[Dict]:
+        client = self._async_client()
+        with metrics.span("arxiv", op="search") as sp:
+            for attempt in range(self.num_retries + 1):
+                await asyncio.sleep(self._reserve())
+                try:
+                    r = await client.get(self.api_url, params=self._params(query, max_results))
+                    r.raise_for_status()
+                    return self._parse(r, max_results, sp)
+                except Exception as e:
+                    if attempt >= self.num_retries or not self._retryable(e):
+                        raise
+                    metrics.inc("arxiv_retries_total")
+                    await asyncio.sleep(self.min_interval * (2 ** attempt))
+        return []
+
+    # -- query variants --
+    def search_many(self, queries: List[str], max_results: int = 5, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Run several query variants concurrently (still under the global rate
+        limit) and merge them, deduplicated by arXiv id. A failing variant is
+        dropped unless every variant fails.
+        """
+        if not queries:
+            return []
+        with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+            futures = [pool.submit(self.search, q, max_results) for q in queries]
+        return self._merge([f.exception() or f.result() for f in futures], limit)
+
+    async def asearch_many(self, queries: List[str], max_results: int = 5, limit: Optional[int] = None) -> List[Dict]:
+        if not queries:
+            return []
+        results = await asyncio.gather(*(self.asearch(q, max_results) for q in queries), return_exceptions=True)
+        return self._merge(list(results), limit)
+
+    @staticmethod
+    def _merge(results: List, limit: Optional[int]) -> List[Dict]:
+        ok = [r for r in results if not isinstance(r, BaseException)]
+        if not ok:
+            raise results[0]
+        return merge_results(ok, limit=limit)
+
+    # -- lifecycle --
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        self.close()
+        for client in list(self._aclients.values()):
+            try:
+                await client.aclose()
+            except Exception:
+                pass  # bound to a loop that is already gone
+        self._aclients.clear()
+
+
+_service: Optional[ArxivService] = None
+_service_lock = threading.Lock()
+
+
+def get_arxiv_service() -> ArxivService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ArxivService()
+    return _service
@@ -1,14 +1,43 @@
 # utils/cache.py
 from __future__ import annotations
-import chromadb
+
+import asyncio
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
 COLLECTION_NAME = "papers"
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./.chroma")
+
+_chroma_client = None
+_chroma_lock = threading.Lock()
+
+
+def get_chroma_client():
+    """
+    Persistent Chroma client, opened on first use: importing chromadb and
+    opening the DB is too slow to do whenever this module is imported.
+    """
+    global _chroma_client
+    if _chroma_client is None:
+        with _chroma_lock:
+            if _chroma_client is None:
+                import chromadb
+
+                # ✅ new recommended API (persistent local DB)
+                _chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return _chroma_client
 
-# ✅ new recommended API (persistent local DB)
-chroma_client = chromadb.PersistentClient(path="./.chroma")
 
 def get_collection():
-    return chroma_client.get_or_create_collection(
+    return get_chroma_client().get_or_create_collection(
         name=COLLECTION_NAME,
         metadata={"hnsw:space": "cosine"},
     )
@@ -17,25 +46,310 @@ def cache_key(query: str, model: str, version: str) -> str:
     return f"{query}:{model}:{version}".lower()
 
 
+# ----- Semantic query index -----
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# Neighbours checked per lookup, so an expired nearest match doesn't hide a live one
+SEMANTIC_LOOKUP_K = int(os.getenv("SEMANTIC_LOOKUP_K", "5"))
+# Every this many additions, queries whose results are gone are dropped from the index
+SEMANTIC_SWEEP_EVERY = int(os.getenv("SEMANTIC_SWEEP_EVERY", "256"))
+
+_semantic_adds = itertools.count(1)
+
+
+def get_query_index(dim: int, model: str, version: str):
+    """
+    Memory-mapped index of previously answered queries, one per scope and
+    embedding size so switching models or embedding backends never mixes
+    vector spaces.
+    """
+    from utils.vector_index import get_index
+
+    scope = re.sub(r"[^\w.-]+", "_", f"{model}_{version}")
+    return get_index(f"queries_{scope}", dim)
+
+
+def semantic_add(query: str, key: str, embedding: List[float], model: str, version: str) -> None:
+    index = get_query_index(len(embedding), model, version)
+    index.add([key], [embedding])
+    if SEMANTIC_SWEEP_EVERY > 0 and next(_semantic_adds) % SEMANTIC_SWEEP_EVERY == 0:
+        # Expired or evicted results: their queries can never be served again
+        cache = get_result_cache()
+        index.delete([k for k in index.ids() if k not in cache])
+
+
+def semantic_lookup(
+    embedding: List[float],
+    model: str,
+    version: str,
+    threshold: float = SEMANTIC_CACHE_THRESHOLD,
+) -> Optional[Tuple[str, str, float]]:
+    """
+    Nearest previously answered query whose result is still cached ->
+    (cache key, query, cosine similarity), or None when nothing clears
+    `threshold`. Matches whose result is gone are dropped from the index.
+    The query is recovered from the key, so it comes back lower-cased.
+    """
+    index = get_query_index(len(embedding), model, version)
+    cache = get_result_cache()
+    dead: List[str] = []
+    try:
+        for key, similarity in index.search_one(embedding, k=SEMANTIC_LOOKUP_K):
+            similarity = min(1.0, similarity)
+            if similarity < threshold:
+                break
+            if key in cache:
+                return key, key.rsplit(":", 2)[0], similarity
+            dead.append(key)
+        return None
+    finally:
+        if dead:
+            index.delete(dead)
+
+
+# ----- Result cache -----
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "./.cache/results.sqlite3")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+RESULT_CACHE_MAX_ITEMS = int(os.getenv("RESULT_CACHE_MAX_ITEMS", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Memory hits refresh the disk tier's LRU order in batches, at most this often (seconds)
+RESULT_CACHE_TOUCH_INTERVAL = float(os.getenv("RESULT_CACHE_TOUCH_INTERVAL", "30"))
+
+
+class ResultCache:
+    """
+    Two-tier result cache:
+      - front: bounded in-process LRU of JSON payloads
+      - back:  SQLite table of zlib-compressed JSON, bounded by total bytes
+
+    Every entry carries its own expiry (ttl=None -> default_ttl, ttl<=0 -> never).
+    Values must be JSON-serializable; hits return a fresh copy. Memory hits
+    are written back to the disk tier's `accessed` column in batches, so
+    entries hot in memory are not the first ones the disk LRU evicts.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = RESULT_CACHE_PATH,
+        max_items: int = RESULT_CACHE_MAX_ITEMS,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        default_ttl: float = RESULT_CACHE_TTL,
+    ) -> None:
+        self.path = path
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.RLock()
+        self._mem: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "evictions": 0, "expired": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        self._touched: Dict[str, float] = {}  # memory hits not yet written to disk
+        self._touch_flushed = time.monotonic()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    # -- helpers --
+    def _expiry(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.default_ttl if ttl is None else ttl
+        return time.time() + ttl if ttl and ttl > 0 else None
+
+    def _remember(self, key: str, payload: bytes, expires: Optional[float]) -> None:
+        self._mem[key] = (payload, expires)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _touch_due(self) -> bool:
+        return bool(self._touched) and time.monotonic() - self._touch_flushed >= RESULT_CACHE_TOUCH_INTERVAL
+
+    def _flush_touches(self) -> None:
+        with self._lock:
+            if self._touched and self._db is not None:
+                self._db.executemany(
+                    "UPDATE results SET accessed = MAX(accessed, ?) WHERE key = ?",
+                    [(t, k) for k, t in self._touched.items()],
+                )
+            self._touched.clear()
+            self._touch_flushed = time.monotonic()
+
+    def _evict_disk(self) -> None:
+        # Up-to-date access times first, so hot entries aren't taken for cold ones
+        self._flush_touches()
+        now = time.time()
+        cur = self._db.execute("DELETE FROM results WHERE expires IS NOT NULL AND expires < ?", (now,))
+        self._stats["expired"] += max(cur.rowcount, 0)
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until we're back under budget
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._mem.pop(key, None)
+            total -= size
+            self._stats["evictions"] += 1
+
+    # -- API --
+    def get(self, key: str, flush: bool = True) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                payload, expires = item
+                if expires is None or expires > now:
+                    self._mem.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    if self._db is not None:
+                        self._touched[key] = now
+                        if flush and self._touch_due():
+                            self._flush_touches()
+                    return json.loads(payload)
+                del self._mem[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    blob, expires = row
+                    if expires is None or expires > now:
+                        self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+                        payload = zlib.decompress(blob)
+                        self._remember(key, payload, expires)
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        return json.loads(payload)
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._stats["expired"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def __contains__(self, key: str) -> bool:
+        """
+        Whether `key` holds a live entry; unlike get(), counts no hit or miss.
+        """
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None and (item[1] is None or item[1] > now):
+                return True
+            if self._db is None:
+                return False
+            row = self._db.execute("SELECT expires FROM results WHERE key = ?", (key,)).fetchone()
+            return row is not None and (row[0] is None or row[0] > now)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        expires = self._expiry(ttl)
+        with self._lock:
+            self._remember(key, payload, expires)
+            if self._db is not None:
+                blob = zlib.compress(payload)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), expires, time.time()),
+                )
+                self._evict_disk()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._mem.pop(key, None)
+            self._touched.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+
+    # -- cross-process locks (shared SQLite file) --
+    def acquire_lock(self, name: str, owner: str, ttl: float = 300.0) -> bool:
+        """
+        Try to take a named lease; expired leases are taken over. Without a
+        disk tier there is nothing to share, so the lock is always granted.
+        """
+        if self._db is None:
+            return True
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM locks WHERE name = ? AND expires < ?", (name, now))
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO locks (name, owner, expires) VALUES (?, ?, ?)",
+                (name, owner, now + ttl),
+            )
+            return cur.rowcount == 1
+
+    def release_lock(self, name: str, owner: str) -> None:
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["memory_items"] = len(self._mem)
+            if self._db is not None:
+                n, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+                out["disk_items"], out["disk_bytes"] = n, size
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+    # -- async wrappers: memory hits stay on the loop, disk I/O goes to a thread --
+    async def aget(self, key: str) -> Optional[Any]:
+        item = self._mem.get(key)
+        if item is not None and (item[1] is None or item[1] > time.time()):
+            value = self.get(key, flush=False)
+            if self._touch_due():
+                await asyncio.to_thread(self._flush_touches)
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
+
+
 # ----- Cache add -----
-def cache_add(query: str, model: str, version: str, result: dict):
-    key = cache_key(query, model, version)
-    col = get_collection()
-    col.upsert(
-        ids=[key],
-        documents=[str(result)],
-        metadatas=[{"model": model, "version": version}],
-    )
+def cache_add(query: str, model: str, version: str, result: dict, ttl: Optional[float] = None):
+    get_result_cache().set(cache_key(query, model, version), result, ttl=ttl)
 
 
 # ----- Cache lookup -----
 def cache_get(query: str, model: str, version: str):
-    key = cache_key(query, model, version)
-    col = get_collection()
-    try:
-        res = col.get(ids=[key])
-        if res and res.get("documents"):
-            return eval(res["documents"][0])   # stored as string
-    except Exception:
-        return None
-    return None
+    return get_result_cache().get(cache_key(query, model, version))
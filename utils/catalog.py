@@ -0,0 +1,225 @@
+# utils/catalog.py
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.arxiv_client import base_id, parse_arxiv_id
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", "./.cache/catalog.sqlite3")
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "for", "from", "how", "in", "is",
+    "of", "on", "or", "the", "to", "via", "what", "with",
+}
+
+
+def _terms(query: str) -> List[str]:
+    seen: List[str] = []
+    for t in _TOKEN.findall(query.lower()):
+        if t not in _STOPWORDS and t not in seen:
+            seen.append(t)
+    return seen
+
+
+class PaperCatalog:
+    """
+    Persistent local catalog of papers seen in search results.
+
+    - SQLite table keyed by arXiv id (version-less), plus an FTS5 index over
+      title/abstract ranked with BM25 (porter stemming, title weighted 2x).
+    - Optional vector index: pass an EmbeddingProvider and title+abstract
+      vectors are kept in a memory-mapped vector index as well.
+
+    Hits carry `score` in [0, 1]: the share of query terms the paper matches
+    (or the cosine similarity for vector-only hits), so callers can decide
+    whether the catalog answer is good enough.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH, emb: Any = None) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._emb = emb
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS papers (
+                id INTEGER PRIMARY KEY,
+                arxiv_id TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                abstract TEXT NOT NULL,
+                url TEXT NOT NULL,
+                pdf_url TEXT,
+                updated REAL NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                title, abstract, tokenize = 'porter unicode61'
+            );
+            """
+        )
+
+    # -- writes --
+    def add_papers(self, papers: Iterable[Dict]) -> int:
+        """
+        Upsert search results (dicts with title/abstract/url/pdf_url). Returns
+        the number of papers written; entries without an arXiv id are skipped.
+        """
+        rows = []
+        for p in papers:
+            arxiv_id = p.get("arxiv_id") or parse_arxiv_id(p.get("url", ""))
+            if not arxiv_id or not p.get("title"):
+                continue
+            rows.append((base_id(arxiv_id), p))
+        if not rows:
+            return 0
+
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for key, p in rows:
+                    row = self._db.execute("SELECT id FROM papers WHERE arxiv_id = ?", (key,)).fetchone()
+                    values = (p["title"].strip(), (p.get("abstract") or "").strip(), p.get("url", ""), p.get("pdf_url"), now)
+                    if row:
+                        rowid = row[0]
+                        self._db.execute(
+                            "UPDATE papers SET title = ?, abstract = ?, url = ?, pdf_url = ?, updated = ? WHERE id = ?",
+                            values + (rowid,),
+                        )
+                        self._db.execute("DELETE FROM papers_fts WHERE rowid = ?", (rowid,))
+                    else:
+                        rowid = self._db.execute(
+                            "INSERT INTO papers (arxiv_id, title, abstract, url, pdf_url, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                            (key,) + values,
+                        ).lastrowid
+                    self._db.execute(
+                        "INSERT INTO papers_fts (rowid, title, abstract) VALUES (?, ?, ?)",
+                        (rowid, values[0], values[1]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+        if self._emb is not None:
+            self._index_vectors([(key, p) for key, p in rows])
+        return len(rows)
+
+    def _index_vectors(self, rows: List[tuple]) -> None:
+        texts = [f"{p['title']}\n\n{p.get('abstract', '')}" for _, p in rows]
+        vecs = self._emb.embed_documents(texts)
+        if not len(vecs):
+            return
+        self._vector_index(len(vecs[0])).add([k for k, _ in rows], vecs)
+
+    def _vector_index(self, dim: int):
+        from utils.vector_index import get_index
+
+        return get_index("catalog", dim)
+
+    # -- reads --
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def _fetch(self, where: str, args: tuple) -> Dict[int, Dict]:
+        rows = self._db.execute(
+            f"SELECT id, arxiv_id, title, abstract, url, pdf_url FROM papers WHERE {where}", args
+        ).fetchall()
+        return {
+            r[0]: {"title": r[2], "abstract": r[3], "url": r[4], "pdf_url": r[5], "arxiv_id": r[1]}
+            for r in rows
+        }
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """
+        Best catalog matches for `query`, highest relevance first.
+        """
+        terms = _terms(query)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+
+        with self._lock:
+            ranked = self._db.execute(
+                "SELECT rowid, bm25(papers_fts, 2.0, 1.0) FROM papers_fts WHERE papers_fts MATCH ? "
+                "ORDER BY bm25(papers_fts, 2.0, 1.0) LIMIT ?",
+                (match, max(limit * 4, 20)),
+            ).fetchall()
+            if not ranked:
+                hits: Dict[int, Dict] = {}
+            else:
+                ids = [r[0] for r in ranked]
+                marks = ",".join("?" * len(ids))
+                # Term coverage, with the same stemming as the index
+                coverage = {rowid: 0 for rowid in ids}
+                for t in terms:
+                    for (rowid,) in self._db.execute(
+                        f"SELECT rowid FROM papers_fts WHERE papers_fts MATCH ? AND rowid IN ({marks})",
+                        (f'"{t}"', *ids),
+                    ):
+                        coverage[rowid] += 1
+                hits = self._fetch(f"id IN ({marks})", tuple(ids))
+                for rowid, bm25 in ranked:
+                    if rowid in hits:
+                        hits[rowid]["score"] = coverage[rowid] / len(terms)
+                        hits[rowid]["bm25"] = -bm25
+
+        out = sorted(hits.values(), key=lambda h: (-h["score"], -h["bm25"]))
+        if self._emb is not None:
+            out = self._merge_vector_hits(query, out, limit)
+        return out[:limit]
+
+    def _merge_vector_hits(self, query: str, hits: List[Dict], limit: int) -> List[Dict]:
+        vec = self._emb.embed_query(query)
+        res = self._vector_index(len(vec)).search_one(vec, k=limit)
+        if not res:
+            return hits
+        by_id = {h["arxiv_id"]: h for h in hits}
+        for key, sim in res:
+            if key in by_id:
+                by_id[key]["score"] = max(by_id[key]["score"], sim)
+                continue
+            with self._lock:
+                found = list(self._fetch("arxiv_id = ?", (key,)).values())
+            if found:
+                found[0]["score"], found[0]["bm25"] = sim, 0.0
+                by_id[key] = found[0]
+        return sorted(by_id.values(), key=lambda h: (-h["score"], -h["bm25"]))
+
+
+_catalog: Optional[PaperCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(emb: Any = None) -> PaperCatalog:
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = PaperCatalog(emb=emb)
+    return _catalog
+
+
+def seed_from_jsonl(path: str, catalog: Optional[PaperCatalog] = None) -> int:
+    """
+    Pre-seed the catalog from a JSONL file of paper dicts (one per line).
+    """
+    catalog = catalog or get_catalog()
+    with open(path, encoding="utf-8") as f:
+        papers = [json.loads(line) for line in f if line.strip()]
+    return catalog.add_papers(papers)
+
+
+if __name__ == "__main__":
+    # python -m utils.catalog papers.jsonl [more.jsonl ...]
+    total = sum(seed_from_jsonl(p) for p in sys.argv[1:])
+    print(f"Seeded {total} papers into {CATALOG_PATH}")
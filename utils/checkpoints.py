@@ -0,0 +1,507 @@
+# utils/checkpoints.py
+"""
+LangGraph checkpointers:
+  - durable checkpoints for the research workflow, so a failed or cut-off run
+    can resume from its last completed node instead of redoing search and
+    every summary
+  - bounded, evicting conversation memory for the ReAct agent
+
+Imported from graph.build_workflow and reAct only, keeping langgraph off the
+import path.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from utils import metrics
+
+# Optional: persistent checkpoints (pip install langgraph-checkpoint-sqlite)
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    _HAS_SQLITE = True
+except Exception:
+    _HAS_SQLITE = False
+
+CHECKPOINTS = os.getenv("CHECKPOINTS", "1").lower() in ("1", "true", "yes")
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./.cache/checkpoints.sqlite3")
+# Runs not written to for this many seconds (partial, failed or abandoned) are deleted
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", str(24 * 3600)))
+CHECKPOINT_SWEEP_INTERVAL = 300.0
+
+
+class _Expiry:
+    """
+    Retention for checkpoint savers: `_expired(now)` lists threads last
+    written more than `ttl` seconds ago; put() calls `_maybe_sweep()`, which
+    deletes them at most every CHECKPOINT_SWEEP_INTERVAL seconds.
+    """
+
+    ttl: float = CHECKPOINT_TTL
+    _swept: float = 0.0
+
+    def _expired(self, now: float) -> List[str]:
+        raise NotImplementedError
+
+    def sweep(self) -> int:
+        now = time.time()
+        self._swept = now
+        if self.ttl <= 0:
+            return 0
+        expired = self._expired(now)
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        if expired:
+            metrics.inc("checkpoints_expired_total", len(expired))
+            print(f"Checkpoints: dropped {len(expired)} runs idle for over {self.ttl:.0f}s")
+        return len(expired)
+
+    def _maybe_sweep(self) -> None:
+        if time.time() - self._swept >= CHECKPOINT_SWEEP_INTERVAL:
+            self.sweep()
+
+
+class ExpiringMemorySaver(_Expiry, InMemorySaver):
+    """
+    InMemorySaver whose runs expire after `ttl` idle seconds.
+    """
+
+    def __init__(self, ttl: float = CHECKPOINT_TTL) -> None:
+        super().__init__()
+        self.ttl = ttl
+        self._updated: Dict[str, float] = {}
+
+    def _expired(self, now: float) -> List[str]:
+        return [t for t, updated in list(self._updated.items()) if now - updated > self.ttl]
+
+    def put(self, config: Dict[str, Any], checkpoint: Any, metadata: Any, new_versions: Any) -> Dict[str, Any]:
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        self._updated[config["configurable"]["thread_id"]] = time.time()
+        self._maybe_sweep()
+        return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        self._updated.pop(thread_id, None)
+
+
+if _HAS_SQLITE:
+
+    class ThreadedSqliteSaver(_Expiry, SqliteSaver):
+        """
+        SqliteSaver whose async API runs the sync one on a worker thread.
+        Unlike AsyncSqliteSaver (aiosqlite) it isn't tied to one event loop,
+        so FastAPI's loop and Streamlit's per-interaction asyncio.run() can
+        share it. Runs expire `ttl` seconds after their last checkpoint; the
+        `checkpoint_runs` table tracks that for every process sharing the file.
+        """
+
+        def __init__(self, conn: sqlite3.Connection, ttl: float = CHECKPOINT_TTL) -> None:
+            super().__init__(conn)
+            self.ttl = ttl
+
+        def setup(self) -> None:
+            if self.is_setup:
+                return
+            super().setup()
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoint_runs (thread_id TEXT PRIMARY KEY, updated REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS checkpoint_runs_updated ON checkpoint_runs(updated);
+                """
+            )
+            # Runs checkpointed before retention existed start their clock now
+            self.conn.execute(
+                "INSERT OR IGNORE INTO checkpoint_runs SELECT DISTINCT thread_id, ? FROM checkpoints",
+                (time.time(),),
+            )
+            self.conn.commit()
+
+        def _expired(self, now: float) -> List[str]:
+            with self.cursor(transaction=False) as cur:
+                cur.execute("SELECT thread_id FROM checkpoint_runs WHERE updated < ?", (now - self.ttl,))
+                return [row[0] for row in cur.fetchall()]
+
+        def put(self, config: Dict[str, Any], checkpoint: Any, metadata: Any, new_versions: Any) -> Dict[str, Any]:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            with self.cursor() as cur:
+                cur.execute(
+                    "INSERT OR REPLACE INTO checkpoint_runs (thread_id, updated) VALUES (?, ?)",
+                    (str(config["configurable"]["thread_id"]), time.time()),
+                )
+            self._maybe_sweep()
+            return saved
+
+        def delete_thread(self, thread_id: str) -> None:
+            super().delete_thread(thread_id)
+            with self.cursor() as cur:
+                cur.execute("DELETE FROM checkpoint_runs WHERE thread_id = ?", (str(thread_id),))
+
+        async def aget_tuple(self, config: Dict[str, Any]) -> Any:
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(
+            self,
+            config: Optional[Dict[str, Any]],
+            *,
+            filter: Optional[Dict[str, Any]] = None,
+            before: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None,
+        ) -> AsyncIterator[Any]:
+            items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+            for item in items:
+                yield item
+
+        async def aput(self, config: Dict[str, Any], checkpoint: Any, metadata: Any, new_versions: Any) -> Dict[str, Any]:
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(
+            self,
+            config: Dict[str, Any],
+            writes: Sequence[Tuple[str, Any]],
+            task_id: str,
+            task_path: str = "",
+        ) -> None:
+            await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id: str) -> None:
+            await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+_checkpointer: Any = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer(path: str = CHECKPOINT_PATH) -> Any:
+    """
+    Process-wide checkpointer: SQLite at `path` when langgraph-checkpoint-sqlite
+    is installed, otherwise in memory (runs then only resume within this
+    process). None with CHECKPOINTS=0. Either way, runs idle for over
+    CHECKPOINT_TTL seconds are deleted (see `_Expiry`).
+    """
+    global _checkpointer
+    if not CHECKPOINTS:
+        return None
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                if _HAS_SQLITE:
+                    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                    conn = sqlite3.connect(path, check_same_thread=False)
+                    _checkpointer = ThreadedSqliteSaver(conn)
+                else:
+                    print("langgraph-checkpoint-sqlite not installed; checkpoints kept in memory")
+                    _checkpointer = ExpiringMemorySaver()
+    return _checkpointer
+
+
+# ----- ReAct conversation memory -----
+REACT_MEMORY_MAX_THREADS = int(os.getenv("REACT_MEMORY_MAX_THREADS", "1000"))
+REACT_MEMORY_MAX_BYTES = int(os.getenv("REACT_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+# Per conversation: the oldest turns are dropped past either limit
+REACT_MEMORY_THREAD_CHARS = int(os.getenv("REACT_MEMORY_THREAD_CHARS", "60000"))
+REACT_MEMORY_MAX_MESSAGES = int(os.getenv("REACT_MEMORY_MAX_MESSAGES", "60"))
+# Tool outputs the model has already read are cut to this many characters
+REACT_MEMORY_TOOL_CHARS = int(os.getenv("REACT_MEMORY_TOOL_CHARS", "600"))
+# Seconds an idle conversation stays in memory
+REACT_MEMORY_TTL = float(os.getenv("REACT_MEMORY_TTL", str(6 * 3600)))
+# Evicted conversations are spilled to this SQLite file ("" -> dropped) and reloaded on use
+REACT_MEMORY_SPILL_PATH = os.getenv("REACT_MEMORY_SPILL_PATH", "")
+REACT_MEMORY_SPILL_TTL = float(os.getenv("REACT_MEMORY_SPILL_TTL", str(7 * 24 * 3600)))
+REACT_MEMORY_SPILL_MAX_BYTES = int(os.getenv("REACT_MEMORY_SPILL_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def _text_len(msg: Any) -> int:
+    content = getattr(msg, "content", "")
+    return len(content) if isinstance(content, str) else len(str(content))
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    InMemorySaver for chat threads that stays bounded however long it runs:
+      - only a thread's latest checkpoint (with its blobs and writes) is kept
+      - tool outputs the model has already answered from are truncated to
+        `tool_chars`, and whole turns are dropped oldest first past
+        `thread_chars` or `max_messages`
+      - threads are evicted least recently used past `max_threads` or
+        `max_bytes`, and after `ttl` idle seconds
+      - with `spill_path`, evicted threads go to a SQLite file (bounded by
+        `spill_max_bytes` and `spill_ttl`) and are loaded back on next use
+    """
+
+    def __init__(
+        self,
+        max_threads: int = REACT_MEMORY_MAX_THREADS,
+        max_bytes: int = REACT_MEMORY_MAX_BYTES,
+        thread_chars: int = REACT_MEMORY_THREAD_CHARS,
+        max_messages: int = REACT_MEMORY_MAX_MESSAGES,
+        tool_chars: int = REACT_MEMORY_TOOL_CHARS,
+        ttl: float = REACT_MEMORY_TTL,
+        spill_path: Optional[str] = REACT_MEMORY_SPILL_PATH,
+        spill_ttl: float = REACT_MEMORY_SPILL_TTL,
+        spill_max_bytes: int = REACT_MEMORY_SPILL_MAX_BYTES,
+    ) -> None:
+        super().__init__()
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.thread_chars = thread_chars
+        self.max_messages = max_messages
+        self.tool_chars = tool_chars
+        self.ttl = ttl
+        self.spill_ttl = spill_ttl
+        self.spill_max_bytes = spill_max_bytes
+        self._lock = threading.RLock()
+        # thread id -> last used, least recently used first
+        self._used: "OrderedDict[str, float]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._blob_keys: Dict[str, Set[Tuple[str, str, str, Any]]] = {}
+        self._write_keys: Dict[str, Set[Tuple[str, str, str]]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if spill_path:
+            os.makedirs(os.path.dirname(os.path.abspath(spill_path)), exist_ok=True)
+            self._db = sqlite3.connect(spill_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS threads (
+                    thread_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS threads_accessed ON threads(accessed)")
+
+    # -- compaction --
+    def _compact(self, messages: List[Any]) -> List[Any]:
+        last_ai = max((i for i, m in enumerate(messages) if getattr(m, "type", None) == "ai"), default=-1)
+        out = []
+        for i, m in enumerate(messages):
+            content = getattr(m, "content", None)
+            if getattr(m, "type", None) == "tool" and i < last_ai and isinstance(content, str) and len(content) > self.tool_chars:
+                dropped = len(content) - self.tool_chars
+                m = m.model_copy(update={"content": f"{content[:self.tool_chars]}\n[... {dropped} characters dropped]"})
+            out.append(m)
+
+        # Drop whole turns (a human message up to the next one) so tool calls keep their results
+        sizes = [_text_len(m) for m in out]
+        total, cut = sum(sizes), 0
+        for start in (i for i, m in enumerate(out) if i > 0 and getattr(m, "type", None) == "human"):
+            if len(out) - cut <= self.max_messages and total <= self.thread_chars:
+                break
+            total -= sum(sizes[cut:start])
+            cut = start
+        return out[cut:]
+
+    # -- bookkeeping (callers hold the lock) --
+    def _touch(self, thread_id: str) -> None:
+        self._used[thread_id] = time.time()
+        self._used.move_to_end(thread_id)
+
+    def _account(self, thread_id: str) -> None:
+        size = 0
+        for checkpoints in self.storage.get(thread_id, {}).values():
+            for checkpoint, meta, _ in checkpoints.values():
+                size += len(checkpoint[1]) + len(meta[1])
+        for key in self._blob_keys.get(thread_id, ()):
+            size += len(self.blobs[key][1])
+        for key in self._write_keys.get(thread_id, ()):
+            size += sum(len(w[2][1]) for w in self.writes.get(key, {}).values())
+        self._bytes += size - self._sizes.get(thread_id, 0)
+        self._sizes[thread_id] = size
+
+    def _prune(self, thread_id: str, ns: str, checkpoint_id: str, versions: Dict[str, Any]) -> None:
+        checkpoints = self.storage[thread_id][ns]
+        for old in [cid for cid in checkpoints if cid != checkpoint_id]:
+            del checkpoints[old]
+            self.writes.pop((thread_id, ns, old), None)
+            self._write_keys.get(thread_id, set()).discard((thread_id, ns, old))
+        live = {(thread_id, ns, ch, v) for ch, v in versions.items()}
+        keys = self._blob_keys.get(thread_id, set())
+        for key in [k for k in keys if k[1] == ns and k not in live]:
+            self.blobs.pop(key, None)
+            keys.discard(key)
+
+    def _forget(self, thread_id: str) -> None:
+        self.storage.pop(thread_id, None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        self._used.pop(thread_id, None)
+        self._bytes -= self._sizes.pop(thread_id, 0)
+
+    def _evict(self, keep: str) -> None:
+        now = time.time()
+        for thread_id, used in list(self._used.items()):
+            over = len(self._used) > self.max_threads or self._bytes > self.max_bytes
+            expired = self.ttl > 0 and now - used > self.ttl
+            if not (over or expired):
+                break
+            if thread_id == keep:
+                continue
+            self._spill(thread_id)
+            self._forget(thread_id)
+            metrics.inc("react_memory_evictions_total", reason="ttl" if expired else "size")
+        metrics.gauge("react_memory_threads", len(self._used))
+        metrics.gauge("react_memory_bytes", self._bytes)
+
+    # -- spill to disk --
+    def _spill(self, thread_id: str) -> None:
+        if self._db is None:
+            return
+        checkpoints = [
+            [ns, cid, cp[0], cp[1], meta[0], meta[1], parent]
+            for ns, items in self.storage.get(thread_id, {}).items()
+            for cid, (cp, meta, parent) in items.items()
+        ]
+        blobs = [[ns, ch, v, *self.blobs[(thread_id, ns, ch, v)]] for _, ns, ch, v in self._blob_keys.get(thread_id, ())]
+        writes = [
+            [ns, cid, task_id, idx, channel, value[0], value[1], path]
+            for _, ns, cid in self._write_keys.get(thread_id, ())
+            for (task_id, idx), (_, channel, value, path) in self.writes.get((thread_id, ns, cid), {}).items()
+        ]
+        if not checkpoints:
+            return
+        kind, payload = self.serde.dumps_typed({"checkpoints": checkpoints, "blobs": blobs, "writes": writes})
+        blob = zlib.compress(payload)
+        self._db.execute(
+            "INSERT OR REPLACE INTO threads (thread_id, kind, value, size, accessed) VALUES (?, ?, ?, ?, ?)",
+            (thread_id, kind, blob, len(blob), time.time()),
+        )
+        self._db.execute("DELETE FROM threads WHERE accessed < ?", (time.time() - self.spill_ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM threads").fetchone()[0]
+        if total > self.spill_max_bytes:
+            for old, size in self._db.execute("SELECT thread_id, size FROM threads ORDER BY accessed ASC").fetchall():
+                if total <= self.spill_max_bytes:
+                    break
+                self._db.execute("DELETE FROM threads WHERE thread_id = ?", (old,))
+                total -= size
+
+    def _restore(self, thread_id: str) -> None:
+        if self._db is None or thread_id in self._used:
+            return
+        row = self._db.execute(
+            "SELECT kind, value FROM threads WHERE thread_id = ? AND accessed >= ?",
+            (thread_id, time.time() - self.spill_ttl),
+        ).fetchone()
+        if row is None:
+            return
+        self._db.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+        data = self.serde.loads_typed((row[0], zlib.decompress(row[1])))
+        for ns, cid, cp_type, cp, meta_type, meta, parent in data["checkpoints"]:
+            self.storage[thread_id][ns][cid] = ((cp_type, cp), (meta_type, meta), parent)
+        for ns, ch, v, kind, value in data["blobs"]:
+            self.blobs[(thread_id, ns, ch, v)] = (kind, value)
+            self._blob_keys.setdefault(thread_id, set()).add((thread_id, ns, ch, v))
+        for ns, cid, task_id, idx, channel, kind, value, path in data["writes"]:
+            self.writes[(thread_id, ns, cid)][(task_id, idx)] = (task_id, channel, (kind, value), path)
+            self._write_keys.setdefault(thread_id, set()).add((thread_id, ns, cid))
+        self._touch(thread_id)
+        self._account(thread_id)
+        metrics.inc("react_memory_restores_total")
+        self._evict(keep=thread_id)
+
+    # -- BaseCheckpointSaver (the async variants call these) --
+    def get_tuple(self, config: Dict[str, Any]) -> Any:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._restore(thread_id)
+            found = super().get_tuple(config)
+            if thread_id in self._used:
+                self._touch(thread_id)
+            elif not any(self.storage.get(thread_id, {}).values()):
+                # InMemorySaver's defaultdict just created an empty entry for it
+                self.storage.pop(thread_id, None)
+            return found
+
+    def list(
+        self,
+        config: Optional[Dict[str, Any]],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Any]:
+        with self._lock:
+            if config:
+                self._restore(config["configurable"]["thread_id"])
+            items = list(super().list(config, filter=filter, before=before, limit=limit))
+        yield from items
+
+    def put(self, config: Dict[str, Any], checkpoint: Any, metadata: Any, new_versions: Any) -> Dict[str, Any]:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"]["checkpoint_ns"]
+        values = checkpoint.get("channel_values") or {}
+        if "messages" in new_versions and isinstance(values.get("messages"), list):
+            # Only the stored copy is compacted; the running graph keeps its own state
+            checkpoint = {**checkpoint, "channel_values": {**values, "messages": self._compact(values["messages"])}}
+        with self._lock:
+            self._restore(thread_id)
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            keys = self._blob_keys.setdefault(thread_id, set())
+            keys.update((thread_id, ns, ch, v) for ch, v in new_versions.items())
+            self._prune(thread_id, ns, checkpoint["id"], checkpoint["channel_versions"])
+            self._touch(thread_id)
+            self._account(thread_id)
+            self._evict(keep=thread_id)
+        return saved
+
+    def put_writes(
+        self,
+        config: Dict[str, Any],
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            self._restore(thread_id)
+            super().put_writes(config, writes, task_id, task_path)
+            self._write_keys.setdefault(thread_id, set()).add((thread_id, ns, config["configurable"]["checkpoint_id"]))
+            self._touch(thread_id)
+            self._account(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._forget(thread_id)
+            if self._db is not None:
+                self._db.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"threads": len(self._used), "bytes": self._bytes}
+            if self._db is not None:
+                n, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM threads").fetchone()
+                out["spilled_threads"], out["spilled_bytes"] = n, size
+        return out
+
+
+_react_memory: Optional[BoundedMemorySaver] = None
+_react_memory_lock = threading.Lock()
+
+
+def get_react_memory() -> BoundedMemorySaver:
+    """
+    Conversation memory shared by every ReAct agent in the process, so the
+    caps hold across Streamlit sessions.
+    """
+    global _react_memory
+    if _react_memory is None:
+        with _react_memory_lock:
+            if _react_memory is None:
+                _react_memory = BoundedMemorySaver()
+    return _react_memory
@@ -0,0 +1,60 @@
+# utils/deadline.py
+from __future__ import annotations
+
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# Relative share of the remaining budget each stage may use
+STAGE_SHARES: Dict[str, float] = {
+    "search": 1.0,
+    "retrieve": 1.5,
+    "summarize": 3.0,
+    "synthesize": 2.5,
+    "critique": 2.0,
+    "gaps": 2.0,
+}
+
+# Below this many seconds of allowance a stage is skipped instead of started.
+# Optional stages (retrieve, gaps) need more, so they're the first to go.
+STAGE_MIN_SECONDS: Dict[str, float] = {
+    "search": 0.0,
+    "retrieve": float(os.getenv("DEADLINE_MIN_RETRIEVE", "2")),
+    "summarize": 0.5,
+    "synthesize": 1.0,
+    "critique": 1.0,
+    "gaps": float(os.getenv("DEADLINE_MIN_GAPS", "2.5")),
+}
+
+Stage = Union[str, Tuple[str, ...]]  # a tuple is a group of stages running in parallel
+
+
+class StageBudget:
+    """
+    Splits what is left of a request deadline across the stages still to
+    run: a stage gets remaining * its share / (its share + the shares of
+    every later stage), so time saved early flows to later stages and an
+    overrun early shrinks them.
+    """
+
+    def __init__(self, stages: Sequence[Stage], shares: Optional[Dict[str, float]] = None) -> None:
+        self.stages: List[Tuple[str, ...]] = [s if isinstance(s, tuple) else (s,) for s in stages]
+        self.shares = {**STAGE_SHARES, **(shares or {})}
+
+    def _share(self, group: Tuple[str, ...]) -> float:
+        return max(self.shares.get(s, 1.0) for s in group)
+
+    def allowance(self, stage: str, deadline: float, now: Optional[float] = None) -> float:
+        """
+        Seconds `stage` may take given an absolute (epoch) `deadline`.
+        """
+        remaining = deadline - (time.time() if now is None else now)
+        if remaining <= 0:
+            return 0.0
+        idx = next(i for i, g in enumerate(self.stages) if stage in g)
+        total = sum(self._share(g) for g in self.stages[idx:])
+        return remaining * self.shares.get(stage, 1.0) / total if total else remaining
+
+    @staticmethod
+    def min_seconds(stage: str) -> float:
+        return STAGE_MIN_SECONDS.get(stage, 0.0)
@@ -1,20 +1,89 @@
 from __future__ import annotations
 
-from typing import Iterable, List, Optional
+import hashlib
+import importlib.util
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Union
 
-# Primary: OpenRouter via OpenAI protocol (works with langchain-openai embeddings)
-try:
-    from langchain_openai import OpenAIEmbeddings
-    _HAS_LC_OPENAI = True
-except Exception:
-    _HAS_LC_OPENAI = False
+import numpy as np
+
+from utils import metrics
 
+# Backends are imported on first use: sentence-transformers pulls in torch,
+# which would cost seconds at startup even when OpenRouter does the work.
+# Primary: OpenRouter via OpenAI protocol (works with langchain-openai embeddings)
+_HAS_LC_OPENAI = importlib.util.find_spec("langchain_openai") is not None
 # Fallback: local sentence-transformers for offline / Ollama setups
-try:
-    from sentence_transformers import SentenceTransformer
-    _HAS_ST = True
-except Exception:
-    _HAS_ST = False
+_HAS_ST = importlib.util.find_spec("sentence_transformers") is not None
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./.cache/embeddings.sqlite3")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+
+Vectors = Union[List[List[float]], np.ndarray]
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache: float32 vectors keyed by (model, sha256(text)).
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS vectors (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vec BLOB NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+            """
+        )
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        out: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):  # stay under SQLite's parameter limit
+                part = hashes[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT hash, vec FROM vectors WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                    (model, *part),
+                ).fetchall()
+                for h, blob in rows:
+                    out[h] = np.frombuffer(blob, dtype=np.float32)
+        return out
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO vectors (model, hash, vec) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()],
+            )
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _get_cache(path: str) -> EmbeddingCache:
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(path)
+        return _caches[path]
 
 
 class EmbeddingProvider:
@@ -22,6 +91,11 @@ class EmbeddingProvider:
     Unified embedding provider.
     - Default: OpenRouter (text-embedding-3-small)
     - Fallback: sentence-transformers (all-MiniLM-L6-v2)
+
+    Vectors are cached on disk by content hash per model (`cache_path=None`
+    disables this), computed in batches of `batch_size` (remote batches run
+    `max_concurrency` at a time), and returned as lists or, with
+    `as_numpy=True`, as one float32 array.
     """
 
     def __init__(
@@ -30,37 +104,95 @@ class EmbeddingProvider:
         model: str = "text-embedding-3-small",
         base_url: Optional[str] = "https://openrouter.ai/api/v1",
         api_key_env: str = "OPENROUTER_API_KEY",
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_concurrency: int = EMBED_CONCURRENCY,
+        cache_path: Optional[str] = EMBED_CACHE_PATH,
     ) -> None:
         self._mode = None
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
 
         if use_openrouter and _HAS_LC_OPENAI:
-            import os
             api_key = os.getenv(api_key_env)
             if not api_key:
                 raise RuntimeError(f"{api_key_env} not set in environment")
 
+            from langchain_openai import OpenAIEmbeddings
+
             self._emb = OpenAIEmbeddings(
                 model=model,
                 base_url=base_url,
                 api_key=api_key,
+                chunk_size=self.batch_size,
+                # Send raw text: OpenAI-compatible gateways don't need client-side
+                # tiktoken splitting, which also downloads its encoding on first use
+                check_embedding_ctx_length=False,
             )
             self._mode = "openrouter"
+            self.model_name = f"openrouter:{model}"
         elif _HAS_ST:
+            from sentence_transformers import SentenceTransformer
+
             self._st = SentenceTransformer("all-MiniLM-L6-v2")
             self._mode = "sentencetransformers"
+            self.model_name = "st:all-MiniLM-L6-v2"
         else:
             raise RuntimeError(
                 "No embedding backend available. "
                 "Install `langchain-openai` (and set OPENROUTER_API_KEY) or `sentence-transformers`."
             )
 
-    # API
-    def embed_documents(self, docs: Iterable[str]) -> List[List[float]]:
-        if self._mode == "openrouter":
-            return self._emb.embed_documents(list(docs))
-        return self._st.encode(list(docs), normalize_embeddings=True).tolist()
+        self._cache = _get_cache(cache_path) if cache_path else None
 
-    def embed_query(self, query: str) -> List[float]:
+    # Backend calls (uncached)
+    def _compute(self, texts: List[str]) -> np.ndarray:
+        with metrics.span("embedding", backend=self._mode) as sp:
+            sp.set(items=len(texts), input_chars=sum(len(t) for t in texts))
+            return self._compute_batches(texts)
+
+    def _compute_batches(self, texts: List[str]) -> np.ndarray:
         if self._mode == "openrouter":
-            return self._emb.embed_query(query)
-        return self._st.encode([query], normalize_embeddings=True)[0].tolist()
+            batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+            if len(batches) == 1:
+                parts = [self._emb.embed_documents(batches[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                    parts = list(pool.map(self._emb.embed_documents, batches))  # keeps order
+            return np.asarray([v for part in parts for v in part], dtype=np.float32)
+        return np.asarray(
+            self._st.encode(texts, batch_size=self.batch_size, normalize_embeddings=True),
+            dtype=np.float32,
+        )
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self._cache is None:
+            return self._compute(texts)
+
+        hashes = [EmbeddingCache.key(t) for t in texts]
+        found = self._cache.get_many(self.model_name, list(set(hashes)))
+        todo = list(dict.fromkeys(h for h in hashes if h not in found))
+        metrics.inc("cache_requests_total", len(found), cache="embedding", result="hit")
+        metrics.inc("cache_requests_total", len(todo), cache="embedding", result="miss")
+        if todo:
+            text_of = dict(zip(hashes, texts))
+            fresh = self._compute([text_of[h] for h in todo])
+            new = dict(zip(todo, fresh))
+            self._cache.put_many(self.model_name, new)
+            found.update(new)
+        return np.stack([found[h] for h in hashes])
+
+    # API
+    def embed_documents(self, docs: Iterable[str], as_numpy: bool = False) -> Vectors:
+        arr = self._embed(list(docs))
+        return arr if as_numpy else arr.tolist()
+
+    def embed_query(self, query: str, as_numpy: bool = False) -> Union[List[float], np.ndarray]:
+        if self._mode == "openrouter" and self._cache is None:
+            with metrics.span("embedding", backend=self._mode) as sp:
+                sp.set(items=1, input_chars=len(query))
+                vec = np.asarray(self._emb.embed_query(query), dtype=np.float32)
+        else:
+            vec = self._embed([query])[0]
+        return vec if as_numpy else vec.tolist()
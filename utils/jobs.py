@@ -0,0 +1,243 @@
+# utils/jobs.py
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from utils import metrics
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Jobs waiting beyond this many are rejected (HTTP 429) instead of queued
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "64"))
+# Seconds a finished job (status, result) stays available
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "3600"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+Runner = Callable[["Job"], AsyncIterator[Dict[str, Any]]]
+Fold = Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """
+    One submitted run: its status, the events it produced so far and the
+    state folded from its node events.
+    """
+
+    def __init__(self, query: str, params: Dict[str, Any]) -> None:
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.params = params
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.state: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.task: Optional[asyncio.Task] = None
+        self._cond = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    async def _emit(self, event: Dict[str, Any]) -> None:
+        async with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    async def _finish(self, status: str, error: Optional[str] = None) -> None:
+        async with self._cond:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            # Keep node events for late subscribers; token deltas are only useful live
+            # (followers track `seq`, so dropping them never skips an event)
+            self.events = [e for e in self.events if e.get("type") != "token"]
+            self._cond.notify_all()
+
+    async def follow(self, after: int = -1) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Events with a `seq` above `after`, live until the job finishes.
+        """
+        last = after
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: (self.events and self.events[-1]["seq"] > last) or self.finished)
+                batch = self.events[bisect_right(self.events, last, key=lambda e: e["seq"]):]
+                done = self.finished
+            for event in batch:
+                yield event
+                last = event["seq"]
+            if done:
+                return
+
+    def to_dict(self, position: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "query": self.query,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "position": position,
+            "error": self.error,
+            "state": self.state,
+        }
+
+
+class JobManager:
+    """
+    In-process job queue drained by `workers` asyncio workers.
+
+    submit() returns at once (or raises QueueFull past `max_queue` waiting
+    jobs); `run(job)` yields the job's events (astream_events-style: each
+    has a "type" and an increasing "seq"), whose node deltas are folded
+    into `job.state` with `fold`. Finished jobs stay queryable for
+    `retention` seconds, and `on_finish(job)` may persist them elsewhere
+    (e.g. a cache shared by other worker processes).
+    """
+
+    def __init__(
+        self,
+        run: Runner,
+        fold: Fold,
+        workers: int = JOB_WORKERS,
+        max_queue: int = JOB_QUEUE_MAX,
+        retention: float = JOB_RETENTION,
+        on_finish: Optional[Callable[[Job], Any]] = None,
+    ) -> None:
+        self.run = run
+        self.fold = fold
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.retention = retention
+        self.on_finish = on_finish
+        self._jobs: Dict[str, Job] = {}
+        self._waiting: "OrderedDict[str, Job]" = OrderedDict()
+        self._expiry: Deque[Tuple[float, str]] = deque()
+        self._wakeup: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # -- lifecycle --
+    def _ensure_workers(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Semaphore(0)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def aclose(self) -> None:
+        running = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in self._tasks + running:
+            task.cancel()
+        # Wait for the runs too, so their pipelines are cancelled before shutdown goes on
+        await asyncio.gather(*self._tasks, *running, return_exceptions=True)
+        self._tasks = []
+
+    # -- API --
+    def submit(self, query: str, **params: Any) -> Job:
+        self._purge()
+        if len(self._waiting) >= self.max_queue:
+            metrics.inc("jobs_rejected_total")
+            raise QueueFull(f"{len(self._waiting)} jobs already queued")
+        self._ensure_workers()
+        job = Job(query, params)
+        self._jobs[job.id] = job
+        self._waiting[job.id] = job
+        self._wakeup.release()
+        metrics.gauge("jobs_queued", len(self._waiting))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> Optional[int]:
+        """
+        0-based place in the queue, or None once the job has started.
+        """
+        if job.status != QUEUED:
+            return None
+        for i, jid in enumerate(self._waiting):
+            if jid == job.id:
+                return i
+        return None
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if self._waiting.pop(job_id, None) is not None:
+            await self._done(job, CANCELLED)
+        elif job.task is not None:
+            job.task.cancel()
+            await asyncio.wait({job.task})
+        return job
+
+    # -- internals --
+    async def _worker(self) -> None:
+        while True:
+            await self._wakeup.acquire()
+            if not self._waiting:
+                continue  # its job was cancelled while queued
+            _, job = self._waiting.popitem(last=False)
+            metrics.gauge("jobs_queued", len(self._waiting))
+            job.task = asyncio.ensure_future(self._execute(job))
+            try:
+                await asyncio.shield(job.task)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    job.task.cancel()
+                    raise  # the worker itself is shutting down
+                # otherwise only the job was cancelled (JobManager.cancel)
+            except Exception:
+                pass  # recorded on the job by _execute
+
+    async def _execute(self, job: Job) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        metrics.observe("job_wait_seconds", job.started_at - job.created_at)
+        try:
+            async for event in self.run(job):
+                if event.get("type") == "node":
+                    self.fold(job.state, event["delta"])
+                await job._emit(event)
+        except asyncio.CancelledError:
+            await self._done(job, CANCELLED)
+            raise
+        except Exception as e:
+            await self._done(job, FAILED, f"{type(e).__name__}: {e}")
+            return
+        await self._done(job, DONE)
+
+    async def _done(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        await job._finish(status, error)
+        self._expiry.append((job.finished_at + self.retention, job.id))
+        metrics.inc("jobs_total", status=status)
+        if job.started_at is not None:
+            metrics.observe("job_run_seconds", job.finished_at - job.started_at)
+        if self.on_finish is not None:
+            try:
+                res = self.on_finish(job)
+                if asyncio.iscoroutine(res):
+                    await res
+            except Exception as e:
+                print(f"Job {job.id}: on_finish failed: {e}")
+
+    def _purge(self) -> None:
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, job_id = self._expiry.popleft()
+            self._jobs.pop(job_id, None)
@@ -0,0 +1,280 @@
+# utils/metrics.py
+"""
+In-process metrics in the Prometheus text format, plus optional per-request
+traces.
+
+    with span("llm", task="summarize", model=name) as sp:
+        res = llm.invoke(prompt)
+        sp.set(prompt_tokens=..., output_chars=len(res.content))
+
+Each span feeds `papermind_<call>_duration_seconds` (histogram),
+`papermind_<call>_errors_total` and, for the numeric attributes in COUNTED,
+`papermind_<call>_<attr>_total`. Inside `collect_trace()` the span is also
+appended to that request's trace. With METRICS=0 and no trace active,
+`span()` returns a shared no-op object, so call sites cost one ContextVar read.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from bisect import bisect_left
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS", "1").lower() in ("1", "true", "yes")
+PREFIX = "papermind"
+# Latency buckets (seconds): cache lookups up to slow LLM calls
+BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Span attributes that are also exported as counters
+COUNTED = ("prompt_tokens", "completion_tokens", "input_chars", "output_chars", "bytes", "items")
+
+_HELP: Dict[str, str] = {
+    "request_duration_seconds": "API request latency",
+    "node_duration_seconds": "Workflow node latency",
+    "node_degraded_total": "Nodes skipped, timed out or failed (partial results)",
+    "node_retries_total": "Node attempts retried after a transient error",
+    "checkpoints_expired_total": "Checkpointed runs deleted after CHECKPOINT_TTL without being resumed",
+    "llm_duration_seconds": "LLM call latency per model attempt",
+    "arxiv_duration_seconds": "arXiv search latency (including retries)",
+    "arxiv_retries_total": "arXiv requests retried",
+    "embedding_duration_seconds": "Embedding backend call latency",
+    "pdf_duration_seconds": "PDF download and text extraction latency",
+    "cache_duration_seconds": "Result cache lookup latency (exact, then semantic)",
+    "cache_requests_total": "Cache lookups by cache and result",
+    "singleflight_joins_total": "Requests that joined an identical run already in flight",
+    "jobs_queued": "Research jobs waiting for a worker",
+    "jobs_total": "Research jobs finished, by status",
+    "jobs_rejected_total": "Job submissions rejected because the queue was full",
+    "job_wait_seconds": "Time research jobs spent queued",
+    "job_run_seconds": "Time research jobs spent running",
+    "react_memory_threads": "ReAct conversations held in memory",
+    "react_memory_bytes": "Serialized size of the ReAct conversations held in memory",
+    "react_memory_evictions_total": "ReAct conversations evicted from memory, by reason",
+    "react_memory_restores_total": "ReAct conversations reloaded from the spill file",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Registry:
+    """
+    Thread-safe counters, gauges and fixed-bucket histograms, rendered on demand.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        # per label set: [count per bucket..., sum, count]
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def inc(self, name: str, value: float = 1.0, labels: Optional[Dict[str, Any]] = None) -> None:
+        self.inc_key(name, value, self._key(labels or {}))
+
+    def inc_key(self, name: str, value: float, key: LabelKey) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        key = self._key(labels or {})
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        self.observe_key(name, value, self._key(labels or {}))
+
+    def observe_key(self, name: str, value: float, key: LabelKey) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = [0.0] * (len(self.buckets) + 2)
+            # values above the last bound only count towards +Inf (h[-1])
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _labels(key: LabelKey, extra: str = "") -> str:
+        parts = [f'{k}="{_escape(v)}"' for k, v in key]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            gauges = {n: dict(s) for n, s in self._gauges.items()}
+            histograms = {n: {k: list(h) for k, h in s.items()} for n, s in self._histograms.items()}
+
+        lines: List[str] = []
+        for kind, families in (("counter", counters), ("gauge", gauges)):
+            for name in sorted(families):
+                full = f"{PREFIX}_{name}"
+                lines.append(f"# HELP {full} {_HELP.get(name, name.replace('_', ' '))}")
+                lines.append(f"# TYPE {full} {kind}")
+                for key, value in sorted(families[name].items()):
+                    lines.append(f"{full}{self._labels(key)} {_num(value)}")
+        for name in sorted(histograms):
+            full = f"{PREFIX}_{name}"
+            lines.append(f"# HELP {full} {_HELP.get(name, name.replace('_', ' '))}")
+            lines.append(f"# TYPE {full} histogram")
+            for key, h in sorted(histograms[name].items()):
+                cumulative = 0.0
+                for bound, n in zip(self.buckets, h):
+                    cumulative += n
+                    le = 'le="%s"' % _num(bound)
+                    lines.append(f"{full}_bucket{self._labels(key, le)} {_num(cumulative)}")
+                inf = 'le="+Inf"'
+                lines.append(f"{full}_bucket{self._labels(key, inf)} {_num(h[-1])}")
+                lines.append(f"{full}_sum{self._labels(key)} {h[-2]:.6f}")
+                lines.append(f"{full}_count{self._labels(key)} {_num(h[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+_registry = Registry()
+
+# (trace start, spans) of the request being handled, if it asked for a trace
+_trace: ContextVar[Optional[Tuple[float, List[Dict[str, Any]]]]] = ContextVar("papermind_trace", default=None)
+
+
+def get_registry() -> Registry:
+    return _registry
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    if METRICS_ENABLED:
+        _registry.inc(name, value, labels)
+
+
+def gauge(name: str, value: float, **labels: Any) -> None:
+    if METRICS_ENABLED:
+        _registry.set(name, value, labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    if METRICS_ENABLED:
+        _registry.observe(name, value, labels)
+
+
+def render() -> str:
+    return _registry.render()
+
+
+class Span:
+    """
+    Times one call; see the module docstring for what it records.
+    """
+
+    __slots__ = ("call", "labels", "attrs", "_start")
+
+    def __init__(self, call: str, labels: Dict[str, Any]) -> None:
+        self.call = call
+        self.labels = labels
+        self.attrs: Dict[str, Any] = {}
+        self._start = 0.0
+
+    def set(self, **attrs: Any) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        elapsed = time.perf_counter() - self._start
+        # Cancellation (a lost hedge race, a deadline) isn't an error of the callee
+        failed = exc_type is not None and issubclass(exc_type, Exception)
+        if METRICS_ENABLED:
+            key = Registry._key(self.labels)
+            _registry.observe_key(f"{self.call}_duration_seconds", elapsed, key)
+            if failed:
+                _registry.inc_key(f"{self.call}_errors_total", 1, key)
+            for attr in COUNTED:
+                value = self.attrs.get(attr)
+                if value:
+                    _registry.inc_key(f"{self.call}_{attr}_total", value, key)
+
+        trace = _trace.get()
+        if trace is not None:
+            t0, spans = trace
+            entry = {
+                "call": self.call,
+                **self.labels,
+                "start_ms": round((self._start - t0) * 1000, 1),
+                "ms": round(elapsed * 1000, 1),
+                **self.attrs,
+            }
+            if exc_type is not None:
+                entry["error"] = exc_type.__name__
+            spans.append(entry)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> "_NoopSpan":
+        return self
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(call: str, **labels: Any) -> Any:
+    """
+    Context manager timing one `call` (node, llm, arxiv, embedding, pdf, ...).
+    Keep `labels` low-cardinality: they become Prometheus labels.
+    """
+    if not METRICS_ENABLED and _trace.get() is None:
+        return _NOOP
+    return Span(call, labels)
+
+
+@contextmanager
+def collect_trace(enabled: bool = True) -> Iterator[Optional[List[Dict[str, Any]]]]:
+    """
+    Record every span finished in this context (and tasks/threads started
+    from it) into the yielded list, in completion order. Yields None when
+    not `enabled`.
+    """
+    if not enabled:
+        yield None
+        return
+    spans: List[Dict[str, Any]] = []
+    token = _trace.set((time.perf_counter(), spans))
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
@@ -1,29 +1,122 @@
 from __future__ import annotations
 
 import io
+import os
 import re
-import requests
-from typing import List
-from pypdf import PdfReader
+import threading
+import time
+from typing import TYPE_CHECKING, BinaryIO, List, Optional
 
+if TYPE_CHECKING:
+    # requests and pypdf load on first download / parse, keeping imports cheap
+    import requests
+    from pypdf import PdfReader
 
-def fetch_pdf_bytes(url: str, timeout: int = 20) -> bytes:
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
 
+
+def get_session() -> requests.Session:
+    """
+    Shared keep-alive session for PDF downloads.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                pool = int(os.getenv("PDF_HTTP_POOL", "8"))
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=1)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _session = s
+    return _session
+
+
+def pdf_url_for(url: str) -> str:
     if not url.lower().endswith(".pdf"):
         # arXiv entry pages often end with .abs; convert to pdf URL if needed
         # e.g., http://arxiv.org/abs/2001.00001 -> http://arxiv.org/pdf/2001.00001.pdf
         m = re.search(r"arxiv\.org/(?:abs|pdf)/([\w\.\-]+)", url)
         if m:
             url = f"https://arxiv.org/pdf/{m.group(1)}.pdf"
+    return url
+
+
+def download_pdf(
+    url: str,
+    out: BinaryIO,
+    timeout: float = 20,
+    max_bytes: int | None = None,
+    deadline: float | None = None,
+) -> int:
+    """
+    Stream a PDF into `out` chunk by chunk, aborting as soon as `max_bytes`
+    is exceeded or, given a `deadline` (time.monotonic()), once it has passed.
+    `timeout` alone only bounds each socket read, not the whole transfer.
+    Returns the number of bytes written.
+    """
+    url = pdf_url_for(url)
+    if deadline is not None:
+        timeout = min(timeout, _remaining(url, deadline))
+    with get_session().get(url, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        declared = int(r.headers.get("Content-Length") or 0)
+        if max_bytes is not None and declared > max_bytes:
+            raise ValueError(f"PDF at {url} is {declared} bytes (cap {max_bytes})")
+        size = 0
+        # read1 returns whatever has arrived; iter_content would block until a
+        # full chunk is in, so a trickling server could outlast the deadline
+        read1 = getattr(r.raw, "read1", None)
+        if read1 is not None:
+            chunks = iter(lambda: read1(64 * 1024, decode_content=True), b"")
+        else:
+            chunks = r.iter_content(chunk_size=64 * 1024)
+        for chunk in chunks:
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise ValueError(f"PDF at {url} exceeds {max_bytes} bytes")
+            if deadline is not None:
+                _remaining(url, deadline)
+            out.write(chunk)
+    return size
+
+
+def _remaining(url: str, deadline: float) -> float:
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError(f"PDF download from {url} ran out of time")
+    return left
 
-    r = requests.get(url, timeout=timeout)
-    r.raise_for_status()
-    return r.content
+
+def fetch_pdf_bytes(url: str, timeout: int = 20, max_bytes: int | None = None) -> bytes:
+
+    buf = io.BytesIO()
+    download_pdf(url, buf, timeout=timeout, max_bytes=max_bytes)
+    return buf.getvalue()
 
 
 def extract_text_from_pdf_bytes(data: bytes, max_pages: int | None = None) -> str:
+    from pypdf import PdfReader
+
+    return _extract(PdfReader(io.BytesIO(data)), max_pages)
+
 
-    reader = PdfReader(io.BytesIO(data))
+def extract_text_from_pdf_file(path: str, max_pages: int | None = None) -> str:
+    """
+    Same as `extract_text_from_pdf_bytes` but reads from disk; picklable, so it
+    can run in a process pool without shipping the PDF bytes across.
+    """
+    from pypdf import PdfReader
+
+    with open(path, "rb") as f:
+        return _extract(PdfReader(f), max_pages)
+
+
+def _extract(reader: PdfReader, max_pages: int | None) -> str:
     pages = reader.pages if max_pages is None else reader.pages[:max_pages]
     texts: List[str] = []
     for p in pages:
@@ -41,5 +134,7 @@ def extract_text_from_pdf_bytes(data: bytes, max_pages: int | None = None) -> st
 
 def load_pdf_text(url: str, max_pages: int | None = None) -> str:
 
-    data = fetch_pdf_bytes(url)
-    return extract_text_from_pdf_bytes(data, max_pages=max_pages)
+    # Goes through the on-disk store: each paper is downloaded and parsed once
+    from utils.pdf_store import get_pdf_store
+
+    return get_pdf_store().get_text(url, max_pages=max_pages)
@@ -0,0 +1,301 @@
+# utils/pdf_store.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from utils import metrics
+from utils.arxiv_client import parse_arxiv_id
+from utils.pdf_loader import download_pdf, extract_text_from_pdf_file
+
+PDF_STORE_DIR = os.getenv("PDF_STORE_DIR", "./.cache/pdfs")
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(20 * 1024 * 1024)))
+
+
+def _left(deadline: Optional[float], what: str) -> Optional[float]:
+    # Seconds until `deadline` (None: no limit); TimeoutError once it has passed
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError(f"Ran out of time for {what}")
+    return left
+
+
+class PdfStore:
+    """
+    On-disk PDF + extracted-text cache.
+
+    Entries are keyed by arXiv id incl. version (e.g. 2401.01234v2), falling
+    back to a hash of the URL for non-arXiv links; local files are keyed by
+    path, size and mtime. Next to each <key>.pdf lives <key>.p<pages>.txt, so
+    a known paper is downloaded and parsed exactly once. Downloads stream to
+    disk under a hard size cap; text extraction runs in a process pool so
+    pypdf never holds the GIL of the serving process.
+    """
+
+    def __init__(
+        self,
+        root: str = PDF_STORE_DIR,
+        workers: int = PDF_EXTRACT_WORKERS,
+        max_bytes: int = PDF_MAX_BYTES,
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._workers = max(1, workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_broken = False
+        self._lock = threading.Lock()
+        # key -> [lock, users]; only keys being downloaded have an entry
+        self._key_locks: Dict[str, List] = {}
+
+    # -- keys & paths --
+    @staticmethod
+    def key_for(url: str) -> str:
+        arxiv_id = parse_arxiv_id(url)
+        if arxiv_id:
+            return arxiv_id.replace("/", "_")
+        return "url-" + hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def key_for_file(path: str) -> str:
+        st = os.stat(path)
+        ident = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+        return "file-" + hashlib.sha256(ident.encode("utf-8")).hexdigest()[:32]
+
+    def pdf_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.pdf")
+
+    def text_path(self, key: str, max_pages: Optional[int]) -> str:
+        return os.path.join(self.root, f"{key}.p{max_pages or 'all'}.txt")
+
+    @contextmanager
+    def _key_locked(self, key: str, deadline: Optional[float] = None) -> Iterator[None]:
+        """
+        Serialize downloads of one key (only callers of the same key ever
+        wait), giving up at `deadline`. Entries are dropped once unused.
+        """
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            wait = -1 if deadline is None else max(0.0, deadline - time.monotonic())
+            if not entry[0].acquire(timeout=wait):
+                raise TimeoutError(f"Timed out waiting for another download of {key}")
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        """
+        The extraction pool, or None once it proved unusable (e.g. the host
+        can't spawn workers); extraction then runs on a thread instead.
+        """
+        with self._lock:
+            if self._pool_broken:
+                return None
+            if self._pool is None:
+                # spawn: forking a process that runs threads/event loops is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _pool_failed(self) -> None:
+        with self._lock:
+            self._pool_broken = True
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+        print("PDF extraction pool unavailable; parsing on threads instead")
+
+    # -- files --
+    def _write_atomic(self, path: str, data: str) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read_text(self, path: str) -> Optional[str]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def ensure_pdf(
+        self,
+        url: str,
+        timeout: float = 20,
+        max_bytes: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> str:
+        """
+        Path of the stored PDF for `url`, downloading it first if needed.
+        With a `deadline` (time.monotonic()), waiting for another caller's
+        download of the same paper and the download itself both stop there.
+        """
+        key = self.key_for(url)
+        path = self.pdf_path(key)
+        if os.path.exists(path):
+            return path
+        with self._key_locked(key, deadline):
+            if os.path.exists(path):
+                return path
+            fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".part")
+            try:
+                with metrics.span("pdf", op="download") as sp, os.fdopen(fd, "wb") as f:
+                    size = download_pdf(
+                        url, f, timeout=timeout, max_bytes=max_bytes or self.max_bytes, deadline=deadline
+                    )
+                    sp.set(bytes=size)
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        return path
+
+    # -- sync API --
+    def extract(
+        self,
+        pdf_path: str,
+        key: str,
+        max_pages: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> str:
+        """
+        Text of a stored PDF. With a `deadline`, TimeoutError once it passes
+        (the pool worker still finishes the file in the background).
+        """
+        cached = self._read_text(self.text_path(key, max_pages))
+        metrics.inc("cache_requests_total", cache="pdf_text", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+        pool = self._executor()
+        with metrics.span("pdf", op="extract") as sp:
+            try:
+                if pool is None:
+                    raise BrokenProcessPool
+                future = pool.submit(extract_text_from_pdf_file, pdf_path, max_pages)
+                try:
+                    text = future.result(timeout=_left(deadline, pdf_path))
+                except FutureTimeout:
+                    raise TimeoutError(f"Text extraction of {pdf_path} ran out of time") from None
+            except BrokenProcessPool:
+                if pool is not None:
+                    self._pool_failed()
+                text = extract_text_from_pdf_file(pdf_path, max_pages)
+            sp.set(output_chars=len(text))
+        self._write_atomic(self.text_path(key, max_pages), text)
+        return text
+
+    def get_text(
+        self,
+        url: str,
+        max_pages: Optional[int] = None,
+        timeout: float = 20,
+        max_bytes: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> str:
+        key = self.key_for(url)
+        cached = self._read_text(self.text_path(key, max_pages))
+        if cached is not None:
+            metrics.inc("cache_requests_total", cache="pdf_text", result="hit")
+            return cached
+        path = self.ensure_pdf(url, timeout=timeout, max_bytes=max_bytes, deadline=deadline)
+        return self.extract(path, key, max_pages, deadline=deadline)
+
+    def text_for_file(self, path: str, max_pages: Optional[int] = None, deadline: Optional[float] = None) -> str:
+        return self.extract(path, self.key_for_file(path), max_pages, deadline=deadline)
+
+    # -- async API: downloads on a thread, parsing in the process pool --
+    async def aextract(
+        self,
+        pdf_path: str,
+        key: str,
+        max_pages: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> str:
+        cached = await asyncio.to_thread(self._read_text, self.text_path(key, max_pages))
+        metrics.inc("cache_requests_total", cache="pdf_text", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+        pool = self._executor()
+        with metrics.span("pdf", op="extract") as sp:
+            try:
+                if pool is None:
+                    raise BrokenProcessPool
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(pool, extract_text_from_pdf_file, pdf_path, max_pages)
+                try:
+                    text = await asyncio.wait_for(future, _left(deadline, pdf_path))
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"Text extraction of {pdf_path} ran out of time") from None
+            except BrokenProcessPool:
+                if pool is not None:
+                    self._pool_failed()
+                text = await asyncio.to_thread(extract_text_from_pdf_file, pdf_path, max_pages)
+            sp.set(output_chars=len(text))
+        await asyncio.to_thread(self._write_atomic, self.text_path(key, max_pages), text)
+        return text
+
+    async def aget_text(
+        self,
+        url: str,
+        max_pages: Optional[int] = None,
+        timeout: float = 20,
+        max_bytes: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> str:
+        key = self.key_for(url)
+        cached = await asyncio.to_thread(self._read_text, self.text_path(key, max_pages))
+        if cached is not None:
+            metrics.inc("cache_requests_total", cache="pdf_text", result="hit")
+            return cached
+        # The thread can't be cancelled; `deadline` is what stops a slow download
+        path = await asyncio.to_thread(self.ensure_pdf, url, timeout, max_bytes, deadline)
+        return await self.aextract(path, key, max_pages, deadline=deadline)
+
+    async def atext_for_file(
+        self, path: str, max_pages: Optional[int] = None, deadline: Optional[float] = None
+    ) -> str:
+        key = await asyncio.to_thread(self.key_for_file, path)
+        return await self.aextract(path, key, max_pages, deadline=deadline)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+_store: Optional[PdfStore] = None
+_store_lock = threading.Lock()
+
+
+def get_pdf_store() -> PdfStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PdfStore()
+    return _store
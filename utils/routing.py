@@ -0,0 +1,341 @@
+# utils/routing.py
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from utils import metrics
+
+# Rolling window of calls kept per model
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "100"))
+# Models failing more often than this are tried last
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+# Send a duplicate to the next model once the primary exceeds this latency percentile
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1.0"))
+# Used until a model has HEDGE_MIN_SAMPLES successful calls
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "10.0"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "10"))
+# Upper bound on the share of calls that may be hedged (keeps cost in check)
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+
+
+class LatencyTracker:
+    """
+    Rolling per-model latency and error statistics, shared by all routed
+    LLMs in the process.
+    """
+
+    def __init__(self, window: int = ROUTER_WINDOW) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Deque[Tuple[float, bool]]] = {}
+        self._hedged: Deque[bool] = deque(maxlen=window)
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            self._calls.setdefault(model, deque(maxlen=self.window)).append((latency, ok))
+
+    def record_hedge(self, hedged: bool) -> None:
+        with self._lock:
+            self._hedged.append(hedged)
+
+    def hedge_rate(self) -> float:
+        with self._lock:
+            return sum(self._hedged) / len(self._hedged) if self._hedged else 0.0
+
+    def percentile(self, model: str, p: float) -> Optional[float]:
+        """
+        p-th percentile (0-100) of successful call latencies, or None below
+        HEDGE_MIN_SAMPLES samples.
+        """
+        with self._lock:
+            lat = sorted(t for t, ok in self._calls.get(model, ()) if ok)
+        if len(lat) < HEDGE_MIN_SAMPLES:
+            return None
+        return lat[min(len(lat) - 1, int(round(p / 100 * (len(lat) - 1))))]
+
+    def error_rate(self, model: str) -> float:
+        with self._lock:
+            calls = self._calls.get(model)
+            if not calls:
+                return 0.0
+            return sum(1 for _, ok in calls if not ok) / len(calls)
+
+    def rank(self, models: Sequence[str]) -> List[str]:
+        """
+        Keep the configured (cost) order but move unhealthy models to the back.
+        """
+        healthy = [m for m in models if self.error_rate(m) <= ROUTER_MAX_ERROR_RATE]
+        return healthy + [m for m in models if m not in healthy]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            models = list(self._calls)
+        return {
+            m: {
+                "calls": len(self._calls[m]),
+                "p50": self.percentile(m, 50),
+                "p95": self.percentile(m, 95),
+                "error_rate": self.error_rate(m),
+            }
+            for m in models
+        }
+
+
+_tracker: Optional[LatencyTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = LatencyTracker()
+    return _tracker
+
+
+def answered_by(res: Any) -> Optional[str]:
+    """
+    Model that produced `res` (set by HedgedLLM), if known.
+    """
+    meta = getattr(res, "response_metadata", None) or {}
+    return meta.get("routed_model")
+
+
+def _chars(input: Any) -> int:
+    if isinstance(input, str):
+        return len(input)
+    if isinstance(input, (list, tuple)):
+        return sum(len(c) for c in (getattr(m, "content", m) for m in input) if isinstance(c, str))
+    return 0
+
+
+def _usage(res: Any, input: Any) -> Dict[str, Any]:
+    """
+    Span attributes for one answer: token usage when the provider reports
+    it, prompt/answer sizes in characters always.
+    """
+    content = getattr(res, "content", res)
+    out: Dict[str, Any] = {"input_chars": _chars(input), "output_chars": len(content) if isinstance(content, str) else 0}
+    usage = getattr(res, "usage_metadata", None) or {}
+    if usage:
+        out["prompt_tokens"] = usage.get("input_tokens")
+        out["completion_tokens"] = usage.get("output_tokens")
+    return out
+
+
+def _as_message(res: Any, model: str) -> Any:
+    if isinstance(res, str):  # completion-style LLMs (e.g. Ollama) return plain text
+        from langchain_core.messages import AIMessage
+
+        res = AIMessage(content=res)
+    meta = getattr(res, "response_metadata", None)
+    if isinstance(meta, dict):
+        meta["routed_model"] = model
+    return res
+
+
+def _first_token_handler(fn: Callable[[], None]) -> Any:
+    """
+    Callback handler calling `fn` once, on the first streamed token.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class _FirstToken(BaseCallbackHandler):
+        run_inline = True  # on the event loop, not an executor thread
+
+        def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+            nonlocal fn
+            if fn is not None:
+                f, fn = fn, None
+                f()
+
+    return _FirstToken()
+
+
+def _with_handler(config: Any, handler: Any) -> Any:
+    """
+    `config` (or the one inherited from the running graph) plus `handler`,
+    keeping the callbacks that stream tokens to the caller.
+    """
+    from langchain_core.runnables.config import ensure_config
+
+    config = ensure_config(config)  # copies the inherited callbacks
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        config["callbacks"] = [handler]
+    elif isinstance(callbacks, list):
+        config["callbacks"] = [*callbacks, handler]
+    else:
+        callbacks.add_handler(handler, inherit=True)
+    return config
+
+
+class HedgedLLM:
+    """
+    Latency-aware wrapper over an ordered list of (name, chat model)
+    candidates plus an optional local fallback.
+
+    ainvoke() sends the request to the healthiest preferred model; if it has
+    not answered within that model's HEDGE_PERCENTILE latency, the same
+    request goes to the next candidate and the first answer wins (the other
+    call is cancelled). When every remote candidate fails, the fallback
+    (local Ollama) answers. The winning model is stored in
+    `response_metadata["routed_model"]`; see `answered_by`.
+
+    Hedged duplicates run without callbacks, so only the primary call streams
+    tokens. Once it has streamed one, the primary is committed to: no hedge
+    is sent and a running one is cancelled, so the text shown is the text
+    returned. invoke() only fails over; it never hedges.
+    """
+
+    def __init__(
+        self,
+        candidates: Sequence[Tuple[str, Any]],
+        fallback: Optional[Tuple[str, Any]] = None,
+        tracker: Optional[LatencyTracker] = None,
+        hedge: bool = True,
+        percentile: float = HEDGE_PERCENTILE,
+        task: str = "llm",
+    ) -> None:
+        if not candidates and fallback is None:
+            raise ValueError("HedgedLLM needs at least one model")
+        self.candidates = list(candidates)
+        self.fallback = fallback
+        self.tracker = tracker or get_latency_tracker()
+        self.hedge = hedge
+        self.percentile = percentile
+        self.task = task  # metrics label
+
+    def _ordered(self) -> List[Tuple[str, Any]]:
+        by_name = dict(self.candidates)
+        return [(m, by_name[m]) for m in self.tracker.rank([m for m, _ in self.candidates])]
+
+    def _hedge_delay(self, model: str) -> float:
+        p = self.tracker.percentile(model, self.percentile)
+        return max(HEDGE_MIN_DELAY, p if p is not None else HEDGE_DEFAULT_DELAY)
+
+    # -- sync --
+    def _invoke_one(self, name: str, llm: Any, input: Any, config: Any, **kwargs) -> Any:
+        start = time.monotonic()
+        with metrics.span("llm", task=self.task, model=name) as sp:
+            try:
+                args = (input,) if config is None else (input, config)
+                res = llm.invoke(*args, **kwargs)
+            except Exception:
+                self.tracker.record(name, time.monotonic() - start, False)
+                raise
+            self.tracker.record(name, time.monotonic() - start, True)
+            sp.set(**_usage(res, input))
+        return _as_message(res, name)
+
+    def invoke(self, input: Any, config: Any = None, **kwargs) -> Any:
+        error: Optional[Exception] = None
+        for name, llm in self._ordered() + ([self.fallback] if self.fallback else []):
+            try:
+                return self._invoke_one(name, llm, input, config, **kwargs)
+            except Exception as e:
+                print(f"LLM {name} failed: {type(e).__name__}: {e}")
+                error = e
+        raise error  # type: ignore[misc]
+
+    # -- async --
+    async def _ainvoke_one(self, name: str, llm: Any, input: Any, config: Any, **kwargs) -> Any:
+        start = time.monotonic()
+        with metrics.span("llm", task=self.task, model=name) as sp:
+            try:
+                args = (input,) if config is None else (input, config)
+                if hasattr(llm, "ainvoke"):
+                    res = await llm.ainvoke(*args, **kwargs)
+                else:
+                    res = await asyncio.to_thread(llm.invoke, *args, **kwargs)
+            except asyncio.CancelledError:
+                raise  # lost the race; not a model failure
+            except Exception:
+                self.tracker.record(name, time.monotonic() - start, False)
+                raise
+            self.tracker.record(name, time.monotonic() - start, True)
+            sp.set(**_usage(res, input))
+        return _as_message(res, name)
+
+    async def _race(self, ordered: List[Tuple[str, Any]], input: Any, config: Any, **kwargs) -> Any:
+        """
+        Primary first, hedge to the next candidate after its percentile
+        delay; returns the first successful answer.
+        """
+        started: Dict[asyncio.Future, Tuple[str, float]] = {}
+
+        def start(name: str, llm: Any, cfg: Any) -> asyncio.Future:
+            task = asyncio.ensure_future(self._ainvoke_one(name, llm, input, cfg, **kwargs))
+            started[task] = (name, time.monotonic())
+            return task
+
+        def commit() -> None:
+            # The primary is streaming to the caller; a hedge may no longer win
+            nonlocal streaming
+            streaming = True
+            for task, (other, _) in started.items():
+                if task is not primary and not task.done():
+                    task.cancel()
+                    queue.insert(0, (other, dict(ordered)[other]))  # still there to fail over to
+
+        name, llm = ordered[0]
+        queue = ordered[1:]
+        streaming = False
+        primary = start(name, llm, _with_handler(config, _first_token_handler(commit)))
+        pending = {primary}
+        error: Optional[BaseException] = None
+        hedged = won = False
+        try:
+            while pending:
+                can_hedge = (
+                    self.hedge
+                    and queue
+                    and not hedged
+                    and not streaming
+                    and self.tracker.hedge_rate() < HEDGE_MAX_RATE
+                )
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self._hedge_delay(name) if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.cancelled():
+                        continue  # hedge dropped by commit()
+                    if task.exception() is None:
+                        won = True
+                        return task.result()
+                    error = task.exception()
+                    print(f"LLM call failed: {type(error).__name__}: {error}")
+                if queue and (not done and not streaming or not pending):
+                    # Slow primary -> hedge; failed and nothing else running -> fail over
+                    hedged = hedged or not done
+                    name, llm = queue.pop(0)
+                    cfg = {**(config or {}), "callbacks": []} if not done else config
+                    pending.add(start(name, llm, cfg))
+        finally:
+            for task in pending:
+                task.cancel()
+                if won:
+                    # A lost race counts against the slower model, so a degraded
+                    # primary drops down the ranking instead of being hedged forever
+                    loser, t0 = started[task]
+                    self.tracker.record(loser, time.monotonic() - t0, False)
+            self.tracker.record_hedge(hedged)
+        raise error or RuntimeError("no model answered")
+
+    async def ainvoke(self, input: Any, config: Any = None, **kwargs) -> Any:
+        try:
+            return await self._race(self._ordered(), input, config, **kwargs)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            print(f"Remote models unavailable ({type(e).__name__}); using {self.fallback[0]}")
+            return await self._ainvoke_one(*self.fallback, input, config, **kwargs)
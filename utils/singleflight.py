@@ -0,0 +1,93 @@
+# utils/singleflight.py
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key onto one execution.
+
+    `do` shares a coroutine's result. `stream` shares an async generator: the
+    first caller starts it in a background task and every subscriber (including
+    late joiners, who replay what was already emitted) receives the same items.
+    The shared work is never cancelled just because one caller went away, but
+    a stream is cancelled once its last subscriber has left, so abandoned
+    work (a cancelled job, every client gone) stops spending tokens.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, "_Broadcast"] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls or key in self._streams
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._calls.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(fn())
+            self._calls[key] = fut
+            fut.add_done_callback(lambda _: self._calls.pop(key, None))
+        # shield: a cancelled waiter must not cancel the shared call
+        return await asyncio.shield(fut)
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        bc = self._streams.get(key)
+        if bc is None:
+            bc = _Broadcast(fn())
+            self._streams[key] = bc
+            bc.task.add_done_callback(lambda _, bc=bc: self._forget(key, bc))
+        bc.subscribers += 1
+        try:
+            async for item in bc.subscribe():
+                yield item
+        finally:
+            bc.subscribers -= 1
+            if not bc.subscribers and not bc.done:
+                # Nobody is left to receive it; later callers start afresh
+                self._forget(key, bc)
+                bc.task.cancel()
+
+    def _forget(self, key: str, bc: "_Broadcast") -> None:
+        if self._streams.get(key) is bc:
+            del self._streams[key]
+
+
+class _Broadcast:
+    def __init__(self, source: AsyncIterator[Any]) -> None:
+        self.items: List[Any] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self._cond = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                async with self._cond:
+                    self.items.append(item)
+                    self._cond.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            async with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        i = 0
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: i < len(self.items) or self.done)
+                batch = self.items[i:]
+                finished, error = self.done, self.error
+            for item in batch:
+                yield item
+            i += len(batch)
+            if finished and i >= len(self.items):
+                if error is not None:
+                    raise error
+                return
@@ -0,0 +1,87 @@
+# utils/tokens.py
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, List, Optional
+
+# Optional exact counts; the chars/4 estimate is used when tiktoken (or its
+# encoding file, which it downloads on first use) is unavailable
+try:
+    import tiktoken
+    _HAS_TIKTOKEN = True
+except Exception:
+    _HAS_TIKTOKEN = False
+
+CHARS_PER_TOKEN = 4
+# "tiktoken" (exact when available) or "estimate" (chars/4, never touches the network)
+TOKENIZER = os.getenv("TOKENIZER", "tiktoken")
+
+_encoding: Any = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding() -> Any:
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and _HAS_TIKTOKEN and TOKENIZER == "tiktoken":
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    # cl100k is close enough for budgeting across the routed models
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    print(f"tiktoken unavailable, estimating tokens: {e}")
+                    _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _get_encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    `text` cut down to at most `max_tokens` tokens.
+    """
+    if not text or max_tokens <= 0:
+        return ""
+    enc = _get_encoding()
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
+    return text[: max_tokens * CHARS_PER_TOKEN]
+
+
+def pack(texts: List[str], budget: int, overhead: int = 0) -> List[List[str]]:
+    """
+    Group `texts` (in order) into batches of at most `budget` tokens each,
+    counting `overhead` extra tokens per item (separators). An item larger
+    than the budget gets a batch of its own.
+    """
+    batches: List[List[str]] = []
+    cur: List[str] = []
+    used = 0
+    for t in texts:
+        n = count_tokens(t) + overhead
+        if cur and used + n > budget:
+            batches.append(cur)
+            cur, used = [], 0
+        cur.append(t)
+        used += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def scale_output(input_tokens: int, ratio: float, floor: int, cap: Optional[int] = None) -> int:
+    """
+    Output token limit proportional to the input, clamped to [floor, cap].
+    """
+    n = max(floor, int(input_tokens * ratio))
+    return min(n, cap) if cap else n
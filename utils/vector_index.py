@@ -0,0 +1,304 @@
+# utils/vector_index.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Optional: cross-process locking (POSIX); without it an index must have one writer process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+VECTOR_DIR = os.getenv("VECTOR_DIR", "./.cache/vectors")
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    m = np.asarray(m, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.maximum(norms, 1e-12)
+
+
+class VectorIndex:
+    """
+    Serverless cosine index over a memory-mapped float32 matrix.
+
+    Files (all next to `path`):
+      <path>.vecs  normalized float32 rows, preallocated and grown by doubling
+      <path>.ids   one JSON-encoded id per line; line i belongs to row i
+      <path>.tomb  int64 row numbers that were deleted (tombstones)
+      <path>.meta  {"dim", "count", "ids"}, rewritten after every change
+      <path>.lock  flock()ed by writers, so several processes (uvicorn workers)
+                   can share the files
+
+    Opening only maps the file and reads the id sidecar, so startup stays near
+    instant at hundreds of thousands of rows. Queries are a matrix product plus
+    argpartition; re-adding an id tombstones its old row, and tombstones are
+    compacted away once they exceed `compact_ratio` of the rows. Each call
+    reloads the index first if another process changed `.meta` since.
+    """
+
+    def __init__(self, path: str, dim: int, compact_ratio: float = 0.25) -> None:
+        self.path = path
+        self.dim = dim
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)) or ".", exist_ok=True)
+        self._lock_file = open(path + ".lock", "a+b") if fcntl is not None else None
+        self._lock_depth = 0
+        with self._lock, self._flocked(shared=True):
+            self._load()
+
+    # -- cross-process coordination --
+    @contextmanager
+    def _flocked(self, shared: bool = False) -> Iterator[None]:
+        """
+        Hold the index's file lock (callers hold self._lock). Re-entrant:
+        only the outermost holder takes and releases it.
+        """
+        if self._lock_file is None or self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        self._lock_depth = 1
+        try:
+            yield
+        finally:
+            self._lock_depth = 0
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _meta_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path + ".meta")
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _refresh(self) -> None:
+        # .meta is replaced (new inode) on every change, by any process
+        if self._meta_stamp() != self._stamp:
+            with self._flocked(shared=True):
+                self._load()
+
+    # -- storage --
+    def _load(self) -> None:
+        self._stamp = self._meta_stamp()
+        count = 0
+        self._raw_ids = False
+        if os.path.exists(self.path + ".meta"):
+            with open(self.path + ".meta", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["dim"] != self.dim:
+                raise ValueError(f"{self.path} holds dim={meta['dim']} vectors, not {self.dim}")
+            count = meta["count"]
+            # Older indexes stored ids unescaped; they are rewritten on the next change
+            self._raw_ids = meta.get("ids") != "json"
+
+        self._ids: List[str] = []
+        if os.path.exists(self.path + ".ids"):
+            with open(self.path + ".ids", encoding="utf-8", newline="") as f:
+                data = f.read()
+            if self._raw_ids:
+                self._ids = data.splitlines()
+            else:
+                # Escaped, so ids can hold newlines; a torn last line lies beyond `count`
+                self._ids = [json.loads(line) for line in data.split("\n")[:count] if line]
+        count = min(count, len(self._ids))
+        del self._ids[count:]
+
+        self._alive = np.ones(count, dtype=bool)
+        if os.path.exists(self.path + ".tomb"):
+            tomb = np.fromfile(self.path + ".tomb", dtype=np.int64)
+            self._alive[tomb[tomb < count]] = False
+        self._row: Dict[str, int] = {i: r for r, i in enumerate(self._ids) if self._alive[r]}
+
+        self._count = count
+        self._map(max(count, 1024))
+
+    def _map(self, capacity: int) -> None:
+        fname = self.path + ".vecs"
+        need = capacity * self.dim * 4
+        if not os.path.exists(fname) or os.path.getsize(fname) < need:
+            with open(fname, "ab") as f:
+                f.truncate(need)
+        self._capacity = os.path.getsize(fname) // (self.dim * 4)
+        self._vecs = np.memmap(fname, dtype=np.float32, mode="r+", shape=(self._capacity, self.dim))
+
+    def _write_meta(self) -> None:
+        tmp = self.path + ".meta.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": self._count, "ids": "json"}, f)
+        os.replace(tmp, self.path + ".meta")
+        self._stamp = self._meta_stamp()
+
+    def _write_ids(self, ids: List[str]) -> None:
+        # json.dumps escapes every line separator, so one line is always one id
+        with open(self.path + ".ids.tmp", "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(i) + "\n" for i in ids))
+        os.replace(self.path + ".ids.tmp", self.path + ".ids")
+        self._raw_ids = False
+
+    def _upgrade(self) -> None:
+        if self._raw_ids:
+            self._write_ids(self._ids)
+
+    def flush(self) -> None:
+        with self._lock, self._flocked():
+            self._upgrade()
+            self._vecs.flush()
+            self._write_meta()
+
+    # -- writes --
+    def add(self, ids: Sequence[str], vectors: Iterable[Sequence[float]]) -> None:
+        vecs = _normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        if len(ids) != len(vecs):
+            raise ValueError("ids and vectors differ in length")
+        if not all(isinstance(i, str) for i in ids):
+            raise TypeError("VectorIndex ids must be strings")
+        if not len(ids):
+            return
+        with self._lock, self._flocked():
+            # Another process may have appended or compacted since our last look
+            self._refresh()
+            self._upgrade()
+            replaced = [self._row[i] for i in ids if i in self._row]
+            if replaced:
+                self._tombstone(replaced)
+
+            start, end = self._count, self._count + len(ids)
+            if end > self._capacity:
+                self._vecs.flush()
+                self._map(max(end, self._capacity * 2))
+            self._vecs[start:end] = vecs
+            self._vecs.flush()
+            with open(self.path + ".ids", "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(i) + "\n" for i in ids))
+
+            self._ids.extend(ids)
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            for r, i in enumerate(ids, start):
+                self._row[i] = r
+            self._count = end
+            self._write_meta()
+            self._maybe_compact()
+
+    def delete(self, ids: Iterable[str]) -> int:
+        with self._lock, self._flocked():
+            self._refresh()
+            self._upgrade()
+            rows = [self._row.pop(i) for i in ids if i in self._row]
+            if rows:
+                self._tombstone(rows)
+                self._write_meta()
+                self._maybe_compact()
+            return len(rows)
+
+    def _tombstone(self, rows: List[int]) -> None:
+        self._alive[rows] = False
+        with open(self.path + ".tomb", "ab") as f:
+            f.write(np.asarray(rows, dtype=np.int64).tobytes())
+
+    def _maybe_compact(self) -> None:
+        dead = self._count - int(self._alive.sum())
+        if dead and dead >= self.compact_ratio * self._count:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Rewrite the files without tombstoned rows. Other processes keep their
+        mapping of the replaced files until they notice the new `.meta`.
+        """
+        with self._lock, self._flocked():
+            self._refresh()
+            keep = np.flatnonzero(self._alive[: self._count])
+            live = np.array(self._vecs[keep])
+            ids = [self._ids[r] for r in keep]
+            del self._vecs
+
+            capacity = max(len(ids) * 2, 1024)
+            tmp = self.path + ".vecs.tmp"
+            with open(tmp, "wb") as f:
+                f.write(live.tobytes())
+                f.truncate(capacity * self.dim * 4)
+            os.replace(tmp, self.path + ".vecs")
+            self._write_ids(ids)
+            if os.path.exists(self.path + ".tomb"):
+                os.remove(self.path + ".tomb")
+
+            self._ids = ids
+            self._alive = np.ones(len(ids), dtype=bool)
+            self._row = {i: r for r, i in enumerate(ids)}
+            self._count = len(ids)
+            self._write_meta()
+            self._map(capacity)
+
+    # -- reads --
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._row)
+
+    def __contains__(self, id_: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return id_ in self._row
+
+    def ids(self) -> List[str]:
+        """
+        Ids of the live rows.
+        """
+        with self._lock:
+            self._refresh()
+            return list(self._row)
+
+    def search(self, queries: Sequence, k: int = 5) -> List[List[Tuple[str, float]]]:
+        """
+        Top-k (id, cosine similarity) for each query row, best first.
+        A single 1-D query still returns a list with one result list.
+        """
+        q = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        with self._lock:
+            self._refresh()
+            n = self._count
+            if not len(self._row):
+                return [[] for _ in range(len(q))]
+            scores = self._vecs[:n] @ q.T  # (n, m)
+            scores[~self._alive[:n]] = -np.inf
+            k = min(k, len(self._row))
+            top = np.argpartition(-scores, k - 1, axis=0)[:k]  # (k, m), unordered
+            out: List[List[Tuple[str, float]]] = []
+            for j in range(q.shape[0]):
+                rows = top[:, j]
+                rows = rows[np.argsort(-scores[rows, j])]
+                out.append([(self._ids[r], float(scores[r, j])) for r in rows if np.isfinite(scores[r, j])])
+            return out
+
+    def search_one(self, query: Sequence[float], k: int = 5) -> List[Tuple[str, float]]:
+        return self.search(query, k)[0]
+
+
+_indexes: Dict[Tuple[str, int], VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(name: str, dim: int, root: Optional[str] = None) -> VectorIndex:
+    """
+    Shared index `<root>/<name>_<dim>`; one per embedding size so different
+    backends never share a vector space.
+    """
+    path = os.path.join(root or VECTOR_DIR, f"{name}_{dim}")
+    with _indexes_lock:
+        idx = _indexes.get((path, dim))
+        if idx is None:
+            idx = VectorIndex(path, dim)
+            _indexes[(path, dim)] = idx
+        return idx